@@ -30,8 +30,8 @@ ulini.set_baudrate(9600)
 ulini.master_write(0x00, USBlini.CHECKSUM_MODE_NONE, [])
 time.sleep(0.2)
 
-# add listener and set master sequence
-ulini.frame_listener_add(frame_listener)
+# add listener for frame 0x15 and set master sequence
+ulini.frame_listener_add(frame_listener, 0x15)
 ulini.master_set_sequence(1000, 200, [0x15])
 
 # Voltage setpoint
@@ -24,9 +24,11 @@ setup(name='usblini',
       classifiers=[
           'Development Status :: 5 - Production/Stable',
           'License :: OSI Approved :: GNU Lesser General Public License v3 (LGPLv3)',
-          'Programming Language :: Python :: 2.7',
-          'Programming Language :: Python :: 3.5'
+          'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3 :: Only',
+          'Programming Language :: Python :: 3.7'
       ],
+      python_requires='>=3.7',
       url='https://github.com/EmbedME/pyUSBlini',
       author='Thomas Fischl',
       author_email='tfischl@gmx.de',
@@ -35,4 +37,7 @@ setup(name='usblini',
       install_requires=[
           'libusb1',
       ],
+      extras_require={
+          'numpy': ['numpy'],
+      },
       zip_safe=False)
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+from usblini import LINFrame
+from usblini.capturefile import CaptureWriter, CaptureReader, numpy
+
+class CaptureFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'capture.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, count, close = True):
+        writer = CaptureWriter(self.filename, blockrecords=100)
+        for i in range(count):
+            frameid = 0x15 if i // 100 == 4 else 0x10 + i % 3
+            writer(LINFrame(frameid, bytes([i & 0xff, 1]), 0x55, i & 0xffff, 0, i * 10, 1000.0 + i * 0.01))
+        writer.flush()
+        if close:
+            writer.close()
+        return writer
+
+    def test_blocks(self):
+        writer = self.write(1050, close=False)
+        reader = CaptureReader(self.filename)
+        # last block without trailer
+        self.assertEqual((reader.blocks, reader.tail, len(reader)), (10, 50, 1050))
+        reader.close()
+        writer.close()
+        reader = CaptureReader(self.filename)
+        self.assertEqual((reader.blocks, reader.tail, len(reader)), (11, 0, 1050))
+        self.assertEqual(len(reader.select_blocks(0x15)), 1)
+        reader.close()
+
+    def test_frames(self):
+        self.write(1050)
+        reader = CaptureReader(self.filename)
+        frames = list(reader.frames(0x10, host_time=(1005.0, 1006.0)))
+        self.assertTrue(frames)
+        self.assertTrue(all(f.frameid == 0x10 and 1005.0 <= f.host_time < 1006.0 for f in frames))
+        self.assertEqual(len(list(reader.frames(device_time=(0, 100)))), 10)
+        self.assertEqual(len(list(reader.frames())), 1050)
+        reader.close()
+
+    @unittest.skipIf(numpy is None, "requires NumPy")
+    def test_query(self):
+        self.write(1050)
+        reader = CaptureReader(self.filename)
+        records = reader.query(0x15)
+        self.assertEqual(len(records), 100)
+        self.assertEqual(records['sequence'][0], 400)
+        self.assertEqual(len(reader.query(0x10, host_time=(1005.0, 1006.0))),
+                         len(list(reader.frames(0x10, host_time=(1005.0, 1006.0)))))
+        reader.close()
+
+    def test_add_after_close(self):
+        writer = self.write(10)
+        writer(LINFrame(0x10, b'\x00', 0))
+        writer.close()
+        reader = CaptureReader(self.filename)
+        self.assertEqual(len(reader), 10)
+        reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+from usblini import checksum
+
+class ChecksumTest(unittest.TestCase):
+
+    def test_protected_id(self):
+        self.assertEqual(checksum.protected_id(0x10), 0x50)
+        self.assertEqual(checksum.protected_id(0x3c), 0x3c)
+        self.assertEqual(checksum.protected_id(0x3d), 0x7d)
+        self.assertEqual(checksum.protected_id(0x00), 0x80)
+
+    def test_classic(self):
+        # example of the LIN specification
+        self.assertEqual(checksum.checksum_classic([0x4a, 0x55, 0x93, 0xe5]), 0xe6)
+        self.assertEqual(checksum.checksum_classic([]), 0xff)
+        self.assertEqual(checksum.checksum_classic([0xff, 0xff]), 0x00)
+
+    def test_enhanced(self):
+        self.assertEqual(checksum.checksum_enhanced(0x10, [0x10, 0x11]), 0x8e)
+        self.assertEqual(checksum.checksum_enhanced(0x10, []), checksum.checksum_classic([0x50]))
+
+    def test_model(self):
+        data = [1, 2, 3]
+        self.assertEqual(checksum.checksum_model(0x10, data, checksum.checksum_enhanced(0x10, data)), checksum.CHECKSUM_MODE_LIN2)
+        self.assertEqual(checksum.checksum_model(0x10, data, checksum.checksum_classic(data)), checksum.CHECKSUM_MODE_LIN1)
+        # diagnostic frames always use the classic checksum
+        self.assertEqual(checksum.checksum_model(0x3c, data, checksum.checksum_enhanced(0x3c, data)), None)
+        self.assertEqual(checksum.checksum_model(0x3c, data, checksum.checksum_classic(data)), checksum.CHECKSUM_MODE_LIN1)
+        self.assertEqual(checksum.checksum_model(0x10, data, None), None)
+
+    @unittest.skipIf(checksum.numpy is None, "requires NumPy")
+    def test_models(self):
+        frames = [(0x10, [1, 2], checksum.checksum_enhanced(0x10, [1, 2])),
+                  (0x11, [3], checksum.checksum_classic([3])),
+                  (0x3c, [1, 2, 3, 4, 5, 6, 7, 8], checksum.checksum_classic(range(1, 9))),
+                  (0x12, [1], 0)]
+        data = [d + [0xaa] * (8 - len(d)) for f, d, c in frames]
+        models = checksum.checksum_models([f for f, d, c in frames], data, [len(d) for f, d, c in frames], [c for f, d, c in frames])
+        self.assertEqual(list(models), [checksum.CHECKSUM_MODE_LIN2, checksum.CHECKSUM_MODE_LIN1,
+                                        checksum.CHECKSUM_MODE_LIN1, checksum.CHECKSUM_MODE_NONE])
+        self.assertEqual(list(checksum.checksum_models([0x10], [[0] * 8], [1], [-1])), [checksum.CHECKSUM_MODE_NONE])
+
+if __name__ == '__main__':
+    unittest.main()
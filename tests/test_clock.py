@@ -0,0 +1,30 @@
+import unittest
+from usblini.clock import DeviceClock
+
+class DeviceClockTest(unittest.TestCase):
+
+    def test_unwrap(self):
+        clock = DeviceClock()
+        times = [clock.unwrap(t & 0xffff) for t in range(60000, 200000, 1000)]
+        self.assertEqual(times, list(range(60000, 200000, 1000)))
+
+    def test_gap_longer_than_wrap(self):
+        clock = DeviceClock()
+        for t in range(0, 10000, 100):
+            clock.update(clock.unwrap(t, 50.0 + t * 1e-3), 50.0 + t * 1e-3 + 0.002)
+        # next report 100 s later, the 16 bit timestamp alone is ambiguous
+        t = 110000
+        self.assertEqual(clock.unwrap(t & 0xffff, 50.0 + t * 1e-3 + 0.002), t)
+
+    def test_offset_and_drift(self):
+        clock = DeviceClock(window=1000)
+        for t in range(0, 60000, 50):
+            # host clock runs 100 ppm faster, transport delay 1..3 ms
+            host = 20.0 + t * 1e-3 * (1 + 1e-4) + 0.001 + (t % 150) * 1e-5
+            clock.update(clock.unwrap(t & 0xffff, host), host)
+        self.assertAlmostEqual(clock.drift, 1e-4, delta=2e-5)
+        self.assertAlmostEqual(clock.to_host(60000), 20.0 + 60 * (1 + 1e-4) + 0.001, delta=5e-4)
+        self.assertAlmostEqual(clock.to_device(clock.to_host(30000)), 30000, delta=0.01)
+
+if __name__ == '__main__':
+    unittest.main()
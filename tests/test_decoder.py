@@ -0,0 +1,52 @@
+import unittest
+from usblini.checksum import protected_id, checksum_classic, checksum_enhanced
+from usblini.decoder import LINDecoder, decode_samples
+
+def signal(frames, baudrate = 19200, samplerate = 100000):
+    """
+    Sampled RX level of the given frames (frameid, data, idle bits after the frame).
+    """
+    bits = [1] * 50
+    for frameid, data, gap in frames:
+        bits += [0] * 13 + [1] * 2
+        checksum = checksum_classic(data) if frameid >= 0x3c else checksum_enhanced(frameid, data)
+        for byte in [0x55, protected_id(frameid)] + list(data) + ([checksum] if data else []):
+            bits += [0] + [(byte >> i) & 1 for i in range(8)] + [1]
+        bits += [1] * gap
+    bittime = samplerate / float(baudrate)
+    return bytes(bits[int(i / bittime)] for i in range(int(len(bits) * bittime)))
+
+FRAMES = [(0x10, bytes([1, 2, 3]), 20), (0x3c, bytes(range(8)), 40), (0x11, b'', 30), (0x15, bytes([0xff, 0]), 100)]
+
+class DecoderTest(unittest.TestCase):
+
+    def test_decode_samples(self):
+        frames = decode_samples(signal(FRAMES), 19200)
+        self.assertEqual([(f.frameid, bytes(f.data)) for f in frames], [(i, d) for i, d, g in FRAMES])
+        self.assertTrue(all(f.error is None for f in frames))
+        self.assertTrue(all(abs(f.baudrate - 19200) < 19200 * 0.02 for f in frames))
+
+    def test_chunks(self):
+        samples = signal(FRAMES * 5)
+        whole = decode_samples(samples, 19200)
+        chunked = decode_samples(samples, 19200, chunksize=777)
+        self.assertEqual(len(whole), 20)
+        self.assertEqual([(f.frameid, bytes(f.data), f.start) for f in whole],
+                         [(f.frameid, bytes(f.data), f.start) for f in chunked])
+
+    def test_listener(self):
+        frames = []
+        decoder = LINDecoder(frames.append)
+        samples = signal(FRAMES)
+        for i in range(0, len(samples), 500):
+            decoder(i, samples[i:i + 500])
+        decoder.flush()
+        self.assertEqual([f.frameid for f in frames], [0x10, 0x3c, 0x11, 0x15])
+        # edges of decoded frames are released
+        self.assertLess(len(decoder.edges), 10)
+
+    def test_wrong_baudrate(self):
+        self.assertEqual(decode_samples(signal(FRAMES, 9600), 19200), [])
+
+if __name__ == '__main__':
+    unittest.main()
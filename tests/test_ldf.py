@@ -0,0 +1,108 @@
+import unittest
+from usblini import LINFrame
+from usblini.ldf import LDF, LDFError, tokenize, numpy
+
+LDF_TEXT = '''
+/* test */
+LIN_description_file;
+LIN_protocol_version = "2.1";
+LIN_language_version = "2.1";
+LIN_speed = 19.2 kbps;
+Nodes {
+  Master: Gateway, 5 ms, 0.1 ms ;
+  Slaves: Panel, Alternator ;
+}
+Signals {
+  Encoder: 8, 0, Panel, Gateway ;
+  Button: 1, 0, Panel, Gateway ;
+  Voltage: 8, 0, Alternator, Gateway ;
+  Indicator: 3, 0, Alternator, Gateway ; // comment
+  Blob: 16, {0, 0}, Panel, Gateway ;
+}
+Frames {
+  PanelStatus: 0x10, Panel, 4 {
+    Encoder, 0 ;
+    Button, 8 ;
+    Blob, 16 ;
+  }
+  AltStatus: 0x15, Alternator, 4 {
+    Indicator, 16 ;
+    Voltage, 24 ;
+  }
+}
+Schedule_tables {
+  Normal {
+    PanelStatus delay 10 ms ;
+    AltStatus delay 20 ms ;
+    AssignNAD { Panel } delay 10 ms ;
+  }
+}
+Signal_encoding_types {
+  VoltEnc {
+    physical_value, 0, 250, 0.1, 8, "V" ;
+    logical_value, 255, "invalid" ;
+  }
+  IndEnc {
+    logical_value, 2, "voltage" ;
+    logical_value, 3, "temperature" ;
+  }
+  ButtonEnc { logical_value, 0, "released"; logical_value, 1, "pressed"; }
+  EncEnc { physical_value, 0, 255, 1, -128 ; }
+}
+Signal_representation {
+  VoltEnc: Voltage ;
+  IndEnc: Indicator ;
+  ButtonEnc: Button ;
+  EncEnc: Encoder ;
+}
+'''
+
+class LDFTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ldf = LDF.from_string(LDF_TEXT)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('a { b, 0x10 } 19.2 kbps "s" // c\n /* x */ ;'),
+                         ['a', '{', 'b', ',', 16, '}', 19.2, 'kbps', 's', ';'])
+
+    def test_header(self):
+        self.assertEqual(self.ldf.speed, 19200)
+        self.assertEqual(self.ldf.master, 'Gateway')
+        self.assertEqual(self.ldf.slaves, ['Panel', 'Alternator'])
+        self.assertEqual(self.ldf.signals['Blob'].init_value, [0, 0])
+        self.assertEqual(self.ldf.frame_by_id(0x15).name, 'AltStatus')
+
+    def test_schedule_tables(self):
+        # master commands keep their delay
+        self.assertEqual(self.ldf.schedule_tables['Normal'], [('PanelStatus', 10), ('AltStatus', 20), (None, 10)])
+
+    def test_decode(self):
+        self.assertEqual(self.ldf.decode(LINFrame(0x10, bytes([0x85, 1, 0x34, 0x12]))),
+                         {'Encoder': 5, 'Button': 'pressed', 'Blob': b'\x34\x12'})
+        self.assertEqual(self.ldf.decode(LINFrame(0x15, bytes([0, 0, 2, 255]))),
+                         {'Indicator': 'voltage', 'Voltage': 'invalid'})
+        decoded = self.ldf.decode(LINFrame(0x15, bytes([0, 0, 3, 140])))
+        self.assertEqual(decoded['Indicator'], 'temperature')
+        self.assertAlmostEqual(decoded['Voltage'], 22.0)
+        self.assertIsNone(self.ldf.decode(LINFrame(0x20, b'')))
+
+    def test_unknown_signal(self):
+        with self.assertRaises(LDFError):
+            LDF.from_string(LDF_TEXT.replace('Voltage, 24 ;', 'Current, 24 ;'))
+
+    @unittest.skipIf(numpy is None, "requires NumPy")
+    def test_decode_records(self):
+        records = numpy.zeros(3, dtype=[('frameid', 'u1'), ('length', 'u1'), ('data', 'u1', 8)])
+        records['frameid'] = [0x15, 0x10, 0x15]
+        records['data'][0][:4] = [0, 0, 3, 100]
+        records['data'][2][:4] = [0, 0, 2, 120]
+        result = self.ldf.decode_records(records)
+        indices, signals = result['AltStatus']
+        self.assertEqual(list(indices), [0, 2])
+        self.assertEqual(list(signals['Indicator']), [3, 2])
+        self.assertEqual([round(v, 1) for v in signals['Voltage']], [18.0, 20.0])
+        self.assertEqual(list(result['PanelStatus'][0]), [1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from usblini.usblini import USBliniError
+from usblini.ldf import LDF
+from usblini.schedule import compile_schedule, compile_ldf_schedule, frame_time, max_gaps
+from .test_ldf import LDF_TEXT
+
+class ScheduleTest(unittest.TestCase):
+
+    def assertPeriodsMet(self, schedule, periods):
+        gaps = max_gaps(schedule.sequence, schedule.period // schedule.frametime)
+        for frameid, period in periods.items():
+            self.assertLessEqual(gaps[frameid] * schedule.frametime, period, hex(frameid))
+
+    def test_frame_time(self):
+        # 8 data bytes at 19200 baud: 124 bits, 1.4 times nominal
+        self.assertAlmostEqual(frame_time(8, 19200, 1.0), 124 / 19.2)
+        self.assertAlmostEqual(frame_time(8, 19200), 1.4 * 124 / 19.2)
+
+    def test_mixed_periods(self):
+        periods = {0x10: 10, 0x11: 100, 0x12: 100}
+        schedule = compile_schedule(periods, 19200, {0x10: 2, 0x11: 2, 0x12: 2})
+        self.assertEqual(schedule.period, 100)
+        self.assertEqual(schedule.frametime, 5)
+        self.assertEqual(schedule.sequence[:4], [0x10, 0x11, 0x10, 0x12])
+        self.assertPeriodsMet(schedule, periods)
+
+    def test_non_harmonic_periods(self):
+        periods = {0x10: 15, 0x11: 10}
+        schedule = compile_schedule(periods, 19200, {0x10: 1, 0x11: 1})
+        self.assertEqual(schedule.period, 30)
+        self.assertPeriodsMet(schedule, periods)
+
+    def test_equal_periods(self):
+        schedule = compile_schedule({0x10: 20, 0x11: 20})
+        self.assertEqual(schedule.as_tuple(), (20, 10, [0x10, 0x11]))
+
+    def test_not_schedulable(self):
+        with self.assertRaises(USBliniError):
+            compile_schedule({0x10: 5, 0x11: 5}, 9600)
+        with self.assertRaises(USBliniError):
+            compile_schedule({0x10: 10, 0x11: 100})
+        with self.assertRaises(USBliniError):
+            compile_schedule({0x10: 100}, frametime=30)
+
+    def test_ldf_equal_delays(self):
+        ldf = LDF.from_string(LDF_TEXT)
+        ldf.schedule_tables['Equal'] = [('PanelStatus', 15), ('AltStatus', 15), ('PanelStatus', 15), ('PanelStatus', 15)]
+        self.assertEqual(compile_ldf_schedule(ldf, 'Equal').as_tuple(), (60, 15, [0x10, 0x15, 0x10, 0x10]))
+
+    def test_ldf_master_command_delay(self):
+        ldf = LDF.from_string(LDF_TEXT)
+        ldf.schedule_tables['Diag'] = [('PanelStatus', 15), ('AltStatus', 10), (None, 20)]
+        self.assertEqual(compile_ldf_schedule(ldf, 'Diag').period, 45)
+        self.assertEqual(compile_ldf_schedule(ldf, 'Normal').period, 40)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -24,8 +24,8 @@ from tkinter.messagebox import showinfo
 from usblini import USBlini
 from usblini import LINFrame
 from usblini import USBliniError
+from usblini.usblini import iter_bits
 import queue
-import zipfile
 
 
 class App(tk.Tk):
@@ -201,17 +201,17 @@ class App(tk.Tk):
         self.recordingActive = 0
 
         self.usblini = USBlini()
-        self.usblini.open(serial)
+        self.usblini.open(serial, ep2_lazy=True)
         self.usblini.reset()
         self.usblini.set_baudrate(19200, True)
 
         self.frame_queue = queue.Queue()
         self.statusreport_queue = queue.Queue()
+        self.statusreport_shown = None
         self.after(10, self.update_frame)
         self.after(10, self.update_statusreport)
         self.usblini.frame_listener_add(self.frame_listener)
         self.usblini.statusreport_listener_add(self.statusreport_listener)
-        self.LR_LUT = [bytearray([(byte & (1 << (7 - i))) and 0x4F or 0x2E for i in range(8)]) for byte in range(256)]
 
         Label(tabSettings, text='Firmware version: {}'.format(self.usblini.get_version()), justify=LEFT).pack(side='top', padx=5, pady=(20,5), anchor='w')
         tk.Button(tabSettings, text='Start bootloader and exit GUI', command=self.startBootloader).pack(side='top', padx=5, anchor='w')
@@ -226,8 +226,7 @@ class App(tk.Tk):
         self.destroy()
 
     def startRecording(self):
-        self.logicoutfile = open("logic-1-1", "wb")
-        self.usblini.logic_listener_add(self.logic_listener)
+        self.recorder = self.usblini.logic_record_start(self.logicfilenameentry.get())
         self.recordingActive = 1
         self.logicStopButton.config(state="normal")
         self.logicStartButton.config(state="disable")
@@ -237,14 +236,10 @@ class App(tk.Tk):
         if self.recordingActive == 0:
             return
         self.recordingActive = 0
-        self.usblini.logic_listener_remove(self.logic_listener)
+        self.usblini.logic_record_stop(self.recorder)
         self.logicStartButton.config(state="normal")
         self.logicStopButton.config(state="disable")
         self.showMessage('Logic level recording stopped')
-        with zipfile.ZipFile(self.logicfilenameentry.get(), 'w', zipfile.ZIP_DEFLATED) as zipped_f:
-            zipped_f.write("logic-1-1")
-            zipped_f.writestr("version", "2")
-            zipped_f.writestr("metadata", "[device 1]\ncapturefile=logic-1\ntotal probes=1\nsamplerate=100 kHz\ntotal analog=0\nprobe1=LIN\nunitsize=1")
 
     def browseLogicFilename(self):
         file_name = asksaveasfilename()
@@ -256,13 +251,12 @@ class App(tk.Tk):
         self.showMessage('Error flags cleared')
 
     def setSlaveTable(self):
-        for x in range(16):
-            self.usblini.slave_set_frame(x, self.slaveTableItem[x].getId(), self.slaveTableItem[x].getChecksummode(), self.slaveTableItem[x].getData(), self.slaveTableItem[x].getReloadvalue(), self.slaveTableItem[x].getResetmask())
+        table = [(item.getId(), item.getChecksummode(), item.getData(), item.getReloadvalue(), item.getResetmask()) for item in self.slaveTableItem]
+        self.usblini.slave_set_table(table)
         self.showMessage('Slave table set')
 
     def clearSlaveTable(self):
-        for x in range(16):
-            self.usblini.slave_set_frame(x, 0, 0, [])
+        self.usblini.slave_set_table([(0, 0, [])] * 16)
         self.showMessage('Slave table cleared')
 
     def setSettings(self):
@@ -340,26 +334,27 @@ class App(tk.Tk):
         self.statusreport_queue.put_nowait(statusreport)
 
     def update_statusreport(self):
+        statusreport = None
         while not self.statusreport_queue.empty():
             statusreport = self.statusreport_queue.get(False)
-            l = statusreport.getSlaveTableStatusList()           
-            for x in range(16):
-                if l[x]:                    
+        if statusreport is not None:
+            # only reconfigure widgets whose state changed since the last shown report
+            for x in iter_bits(statusreport.getChangedSlaveTables(self.statusreport_shown)):
+                if statusreport.isSlaveTableActive(x):
                     self.slaveTableItem[x].lno.config(bg="green")
                 else:
                     self.slaveTableItem[x].lno.config(bg="#d9d9d9")
 
-            for x in range(len(self.errorlist)):
-                if statusreport.errorflags & (1<<x):
+            for x in iter_bits(statusreport.getChangedErrorflags(self.statusreport_shown)):
+                if x >= len(self.errorlist):
+                    continue
+                if statusreport.hasErrorflag(x):
                     self.errorlabel[x].config(fg="red")
                 else:
                     self.errorlabel[x].config(fg="green")
+            self.statusreport_shown = statusreport
         self.after(10, self.update_statusreport)
 
-    def logic_listener(self, data):
-        for d in data:
-            self.logicoutfile.write(self.LR_LUT[d])
-
 class SlaveTableItem(object):
 
     def __init__(self, master, tableid):
@@ -18,18 +18,23 @@ ulini.set_baudrate(19200)
 ulini.master_write(0x00, USBlini.CHECKSUM_MODE_NONE, [])
 time.sleep(0.2)
 
-# travel through all ids
+# request all ids in one master sequence
+results = ulini.scan(range(64), repetitions=2)
+
 print("     0  1  2  3  4  5  6  7  8  9  a  b  c  d  e  f")
 for i in range(0, 64, 16):
     print('{0:02x}: '.format(i), end='')
     for j in range(0, 16):
         address = i + j
-        response = ulini.master_write(address, USBlini.CHECKSUM_MODE_NONE, [])
-        if len(response) > 0:
+        if address in results:
             print('{0:02x} '.format(address), end='')
         else:
             print('-- ', end='')
     print('')
 
+print('')
+for result in results.values():
+    print(result)
+
 # cleanup
-ulini.close()
\ No newline at end of file
+ulini.close()
@@ -18,5 +18,12 @@
 from .usblini import LINFrame
 from .usblini import USBliniError
 from .usblini import USBliniNotFoundError
+from .usblini import USBliniTimeoutError
+from .usblini import USBliniChecksumError
 from .usblini import StatusReport
-from .usblini import USBlini
\ No newline at end of file
+from .usblini import USBlini
+from .usblini import parse_reports
+from .capture import FrameCapture
+from .manager import USBliniManager
+from .ldf import LDF, LDFError
+from .capturefile import CaptureWriter, CaptureReader
\ No newline at end of file
@@ -0,0 +1,173 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import struct
+from .usblini import USBliniError
+from .checksum import checksum_models
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# one capture record, packed without padding so the NumPy dtype matches the struct layout
+RECORD_STRUCT = struct.Struct('<QBB8shHqdH')
+RECORD_FIELDS = [('sequence', '<u8'),
+                 ('frameid', 'u1'),
+                 ('length', 'u1'),
+                 ('data', 'u1', (8,)),
+                 ('checksum', '<i2'),
+                 ('timestamp', '<u2'),
+                 ('device_time', '<i8'),
+                 ('host_time', '<f8'),
+                 ('autobaudvalue', '<u2')]
+
+def pack_frame(buffer, offset, sequence, frame):
+    """
+    Write frame as capture record into buffer.
+    """
+    RECORD_STRUCT.pack_into(buffer, offset,
+                            sequence, frame.frameid, len(frame.data), bytes(frame.data),
+                            -1 if frame.checksum is None else frame.checksum,
+                            frame.timestamp or 0,
+                            -1 if frame.device_time is None else frame.device_time,
+                            float('nan') if frame.host_time is None else frame.host_time,
+                            frame.autobaudvalue or 0)
+
+class FrameCapture(object):
+    """
+    Fixed size ring buffer of received frames, exposed as NumPy structured array.
+    Use it as frame listener. Missing checksum or device time is stored as -1,
+    missing host time as NaN.
+    """
+
+    def __init__(self, size, frameids = None):
+        """
+        :param size: Number of frames the ring buffer can hold
+        :type size: integer
+        :param frameids: LIN frame identifier(s) the capture is registered for (None: all frames)
+        :type frameids: integer or list(int)
+        """
+        if numpy is None:
+            raise USBliniError("ERROR: frame capture requires NumPy")
+        self.size = size
+        self.frameids = frameids
+        self.dtype = numpy.dtype(RECORD_FIELDS)
+        self.raw = bytearray(size * RECORD_STRUCT.size)
+        self.records = numpy.frombuffer(self.raw, dtype=self.dtype)
+        self.sequence = 0
+
+    def __call__(self, frame):
+        self.add(frame)
+
+    def add(self, frame):
+        """
+        Append frame to ring buffer, overwriting the oldest entry if full.
+        :param frame: Frame to add
+        :type frame: LINFrame
+        """
+        pack_frame(self.raw, (self.sequence % self.size) * RECORD_STRUCT.size, self.sequence, frame)
+        self.sequence += 1
+
+    @property
+    def overwritten(self):
+        """
+        Number of frames lost because the ring buffer was full.
+        """
+        return max(0, self.sequence - self.size)
+
+    @property
+    def first_sequence(self):
+        """
+        Sequence number of the oldest frame still available.
+        """
+        return self.overwritten
+
+    def since_sequence(self, sequence):
+        """
+        Get frames with sequence number >= given sequence number as views into the
+        ring buffer (no copy). Returns one view, or two if the range wraps around the
+        end of the buffer. Entries may be overwritten while the views are in use.
+        :param sequence: First sequence number
+        :type sequence: integer
+        :rtype: list(numpy.ndarray)
+        """
+        end = self.sequence
+        start = max(sequence, end - self.size, 0)
+        if start >= end:
+            return []
+        first = start % self.size
+        last = first + end - start
+        if last <= self.size:
+            return [self.records[first:last]]
+        return [self.records[first:], self.records[:last - self.size]]
+
+    def since_device_time(self, device_time):
+        """
+        Get frames with device time >= given device time as views into the ring
+        buffer (see since_sequence).
+        :param device_time: Unwrapped device time in milliseconds
+        :type device_time: integer
+        :rtype: list(numpy.ndarray)
+        """
+        return self.since_sequence(self.sequence_at(device_time, 'device_time'))
+
+    def since_host_time(self, host_time):
+        """
+        Get frames with host time >= given host time as views into the ring buffer
+        (see since_sequence).
+        :param host_time: Host time in seconds
+        :type host_time: float
+        :rtype: list(numpy.ndarray)
+        """
+        return self.since_sequence(self.sequence_at(host_time, 'host_time'))
+
+    def sequence_at(self, value, field):
+        """
+        Sequence number of the first available frame whose field is >= value.
+        """
+        for view in self.since_sequence(0):
+            column = view[field]
+            if len(column) and column[-1] >= value:
+                return int(view['sequence'][numpy.searchsorted(column, value)])
+        return self.sequence
+
+    def get(self, sequence = 0):
+        """
+        Get frames with sequence number >= given sequence number as one contiguous
+        array. This is a view if the range does not wrap, otherwise a copy.
+        :param sequence: First sequence number
+        :type sequence: integer
+        :rtype: numpy.ndarray
+        """
+        views = self.since_sequence(sequence)
+        if len(views) == 1:
+            return views[0]
+        if not views:
+            return self.records[:0]
+        return numpy.concatenate(views)
+
+    @staticmethod
+    def checksum_models(records):
+        """
+        Detect checksum model of captured frames (vectorized).
+        :param records: Captured frames (e.g. result of get)
+        :type records: numpy.ndarray
+        :return: CHECKSUM_MODE_LIN2, CHECKSUM_MODE_LIN1 or CHECKSUM_MODE_NONE (no checksum or no model matches) per frame
+        :rtype: numpy.ndarray
+        """
+        return checksum_models(records['frameid'], records['data'], records['length'], records['checksum'])
@@ -0,0 +1,242 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import math
+import mmap
+import struct
+import threading
+from .usblini import USBliniError, LINFrame
+from .capture import RECORD_STRUCT, RECORD_FIELDS, pack_frame
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# File layout:
+#   header: magic, version, record size, records per block, reserved
+#   blocks: records per block capture records (see capture.RECORD_STRUCT), followed by a
+#           trailer with the number of valid records, the mask of contained frame
+#           identifiers (bit n: frame identifier n) and the device/host time range.
+#   The last block may be incomplete (no trailer) if the writer was not closed.
+HEADER_STRUCT = struct.Struct('<8sHHI16x')
+TRAILER_STRUCT = struct.Struct('<I4xQqqdd')
+MAGIC = b'USBLINIC'
+VERSION = 1
+
+NO_DEVICE_TIME = -1
+
+class CaptureWriter(object):
+    """
+    Append-only capture file writer. Use it as frame listener. Frames added after
+    close are ignored.
+    """
+
+    def __init__(self, filename, blockrecords = 4096, frameids = None):
+        """
+        :param filename: Name of the capture file (overwritten)
+        :type filename: string
+        :param blockrecords: Number of records per block (index granularity)
+        :type blockrecords: integer
+        :param frameids: LIN frame identifier(s) the writer is registered for (None: all frames)
+        :type frameids: integer or list(int)
+        """
+        self.blockrecords = blockrecords
+        self.frameids = frameids
+        self.lock = threading.Lock()
+        self.closed = False
+        self.file = open(filename, 'wb')
+        self.file.write(HEADER_STRUCT.pack(MAGIC, VERSION, RECORD_STRUCT.size, blockrecords))
+        self.record = bytearray(RECORD_STRUCT.size)
+        self.sequence = 0
+        self.block_reset()
+
+    def block_reset(self):
+        self.count = 0
+        self.frameidmask = 0
+        self.min_device_time = NO_DEVICE_TIME
+        self.max_device_time = NO_DEVICE_TIME
+        self.min_host_time = math.nan
+        self.max_host_time = math.nan
+
+    def __call__(self, frame):
+        self.add(frame)
+
+    def add(self, frame):
+        """
+        Append frame.
+        :param frame: Frame to add
+        :type frame: LINFrame
+        """
+        with self.lock:
+            if not self.closed:
+                self.append(frame)
+
+    def append(self, frame):
+        pack_frame(self.record, 0, self.sequence, frame)
+        self.file.write(self.record)
+        self.sequence += 1
+        self.count += 1
+        self.frameidmask |= 1 << frame.frameid
+        if frame.device_time is not None:
+            if self.min_device_time == NO_DEVICE_TIME or frame.device_time < self.min_device_time:
+                self.min_device_time = frame.device_time
+            if frame.device_time > self.max_device_time:
+                self.max_device_time = frame.device_time
+        if frame.host_time is not None:
+            # comparisons with NaN are false
+            if not frame.host_time >= self.min_host_time:
+                self.min_host_time = frame.host_time
+            if not frame.host_time <= self.max_host_time:
+                self.max_host_time = frame.host_time
+        if self.count == self.blockrecords:
+            self.block_close()
+
+    def block_close(self):
+        # fill the incomplete last block, so all blocks have the same size
+        self.file.write(bytes(RECORD_STRUCT.size * (self.blockrecords - self.count)))
+        self.file.write(TRAILER_STRUCT.pack(self.count, self.frameidmask,
+                                            self.min_device_time, self.max_device_time,
+                                            self.min_host_time, self.max_host_time))
+        self.block_reset()
+
+    def flush(self):
+        with self.lock:
+            if not self.closed:
+                self.file.flush()
+
+    def close(self):
+        """
+        Write the index of the last block and close the file.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.count:
+                self.block_close()
+            self.file.close()
+
+
+class CaptureReader(object):
+    """
+    Memory mapped capture file reader. Queries only touch the trailers of all blocks
+    and the records of the blocks matching the frame identifiers and time range.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: Name of the capture file
+        :type filename: string
+        """
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, recordsize, self.blockrecords = HEADER_STRUCT.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or recordsize != RECORD_STRUCT.size:
+            raise USBliniError("ERROR: not a USBlini capture file")
+        self.blocksize = self.blockrecords * RECORD_STRUCT.size + TRAILER_STRUCT.size
+        size = len(self.map) - HEADER_STRUCT.size
+        self.blocks = size // self.blocksize
+        # records of an incomplete last block (writer not closed)
+        self.tail = (size - self.blocks * self.blocksize) // RECORD_STRUCT.size
+        self.index = [TRAILER_STRUCT.unpack_from(self.map, self.block_offset(n) + self.blockrecords * RECORD_STRUCT.size)
+                      for n in range(self.blocks)]
+
+    def __len__(self):
+        return sum(trailer[0] for trailer in self.index) + self.tail
+
+    def block_offset(self, block):
+        return HEADER_STRUCT.size + block * self.blocksize
+
+    def select_blocks(self, frameids = None, device_time = None, host_time = None):
+        """
+        Get blocks which may contain matching records.
+        :return: list of (offset, number of records)
+        """
+        mask = None
+        if frameids is not None:
+            mask = 0
+            for frameid in [frameids] if isinstance(frameids, int) else frameids:
+                mask |= 1 << frameid
+        blocks = []
+        for n, (count, frameidmask, min_dt, max_dt, min_ht, max_ht) in enumerate(self.index):
+            if mask is not None and not frameidmask & mask:
+                continue
+            if device_time is not None and (min_dt == NO_DEVICE_TIME or max_dt < device_time[0] or min_dt >= device_time[1]):
+                continue
+            if host_time is not None and (math.isnan(min_ht) or max_ht < host_time[0] or min_ht >= host_time[1]):
+                continue
+            blocks.append((self.block_offset(n), count))
+        if self.tail:
+            blocks.append((self.block_offset(self.blocks), self.tail))
+        return blocks
+
+    def query(self, frameids = None, device_time = None, host_time = None):
+        """
+        Get records of the given frame identifiers and time range (requires NumPy).
+        :param frameids: LIN frame identifier or set of identifiers (None: all frames)
+        :type frameids: integer or list(int)
+        :param device_time: Range (start, end) of unwrapped device time in milliseconds, end excluded
+        :type device_time: tuple
+        :param host_time: Range (start, end) of host time in seconds, end excluded
+        :type host_time: tuple
+        :rtype: numpy.ndarray
+        """
+        if numpy is None:
+            raise USBliniError("ERROR: capture file queries require NumPy, use frames() instead")
+        dtype = numpy.dtype(RECORD_FIELDS)
+        parts = []
+        for offset, count in self.select_blocks(frameids, device_time, host_time):
+            records = numpy.frombuffer(self.map, dtype=dtype, count=count, offset=offset)
+            selected = numpy.ones(count, dtype=bool)
+            if frameids is not None:
+                selected &= numpy.isin(records['frameid'], list([frameids] if isinstance(frameids, int) else frameids))
+            if device_time is not None:
+                selected &= (records['device_time'] >= device_time[0]) & (records['device_time'] < device_time[1])
+            if host_time is not None:
+                selected &= (records['host_time'] >= host_time[0]) & (records['host_time'] < host_time[1])
+            parts.append(records[selected])
+        if not parts:
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.concatenate(parts)
+
+    def frames(self, frameids = None, device_time = None, host_time = None):
+        """
+        Iterate over the frames of the given frame identifiers and time range.
+        Parameters see query.
+        :rtype: iterator of LINFrame
+        """
+        if frameids is not None:
+            frameids = {frameids} if isinstance(frameids, int) else set(frameids)
+        for offset, count in self.select_blocks(frameids, device_time, host_time):
+            view = memoryview(self.map)[offset:offset + count * RECORD_STRUCT.size]
+            try:
+                for sequence, frameid, length, data, checksum, timestamp, dt, ht, autobaudvalue in RECORD_STRUCT.iter_unpack(view):
+                    if frameids is not None and frameid not in frameids:
+                        continue
+                    if device_time is not None and not device_time[0] <= dt < device_time[1]:
+                        continue
+                    if host_time is not None and not host_time[0] <= ht < host_time[1]:
+                        continue
+                    yield LINFrame(frameid, data[:length], None if checksum < 0 else checksum, timestamp, autobaudvalue,
+                                   None if dt == NO_DEVICE_TIME else dt, None if math.isnan(ht) else ht)
+            finally:
+                view.release()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
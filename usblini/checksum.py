@@ -0,0 +1,126 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# same values as USBlini.CHECKSUM_MODE_*
+CHECKSUM_MODE_NONE = 0x0000
+CHECKSUM_MODE_LIN1 = 0x0100
+CHECKSUM_MODE_LIN2 = 0x0200
+
+def protected_id(frameid):
+    """
+    Calculate protected identifier (frame identifier with parity bits).
+    :param frameid: LIN frame identifier
+    :type frameid: integer
+    :rtype: integer
+    """
+    return PID_TABLE[frameid & 0x3f]
+
+def calculate_protected_id(frameid):
+    p0 = (frameid ^ (frameid >> 1) ^ (frameid >> 2) ^ (frameid >> 4)) & 1
+    p1 = ~((frameid >> 1) ^ (frameid >> 3) ^ (frameid >> 4) ^ (frameid >> 5)) & 1
+    return frameid & 0x3f | p0 << 6 | p1 << 7
+
+PID_TABLE = bytes(calculate_protected_id(frameid) for frameid in range(64))
+
+# checksum for byte sum modulo 255 (eight bit sum with carry is congruent to the plain sum)
+CHECKSUM_TABLE = bytes(~(n or 0xff) & 0xff for n in range(255))
+
+def checksum_from_sum(s):
+    """
+    Get checksum for plain sum of all bytes.
+    :rtype: integer
+    """
+    if s == 0:
+        return 0xff
+    return CHECKSUM_TABLE[s % 255]
+
+def checksum_classic(data):
+    """
+    Calculate classic checksum (LIN 1.x): inverted eight bit sum with carry over data bytes.
+    :param data: Frame data
+    :type data: list(int)
+    :rtype: integer
+    """
+    return checksum_from_sum(sum(data))
+
+def checksum_enhanced(frameid, data):
+    """
+    Calculate enhanced checksum (LIN 2.x): inverted eight bit sum with carry over
+    protected identifier and data bytes.
+    :param frameid: LIN frame identifier
+    :type frameid: integer
+    :param data: Frame data
+    :type data: list(int)
+    :rtype: integer
+    """
+    return checksum_from_sum(PID_TABLE[frameid & 0x3f] + sum(data))
+
+def checksum_model(frameid, data, checksum):
+    """
+    Detect checksum model of a received frame. Diagnostic frames (0x3c, 0x3d) always
+    use the classic checksum.
+    :param frameid: LIN frame identifier
+    :type frameid: integer
+    :param data: Frame data
+    :type data: list(int)
+    :param checksum: Received checksum
+    :type checksum: integer
+    :rtype: integer (CHECKSUM_MODE_LIN2, CHECKSUM_MODE_LIN1) or None if checksum does not match
+    """
+    if checksum is None:
+        return None
+    s = sum(data)
+    if frameid < 0x3c and checksum == checksum_from_sum(PID_TABLE[frameid & 0x3f] + s):
+        return CHECKSUM_MODE_LIN2
+    if checksum == checksum_from_sum(s):
+        return CHECKSUM_MODE_LIN1
+    return None
+
+def checksum_models(frameids, data, lengths, checksums):
+    """
+    Vectorized checksum model detection for arrays of frames, e.g. the columns of a
+    FrameCapture. Requires NumPy.
+    :param frameids: Frame identifiers, shape (n,)
+    :param data: Frame data, shape (n, 8), bytes beyond length are ignored
+    :param lengths: Number of data bytes, shape (n,)
+    :param checksums: Received checksums, shape (n,), negative values mean no checksum
+    :return: Checksum model per frame (CHECKSUM_MODE_LIN2, CHECKSUM_MODE_LIN1 or CHECKSUM_MODE_NONE if not matching)
+    :rtype: numpy.ndarray
+    """
+    frameids = numpy.asarray(frameids, dtype=numpy.intp) & 0x3f
+    data = numpy.asarray(data, dtype=numpy.uint32)
+    lengths = numpy.asarray(lengths)
+    checksums = numpy.asarray(checksums)
+    mask = numpy.arange(data.shape[1]) < lengths[:, None]
+    sums = (data * mask).sum(axis=1)
+    table = numpy.frombuffer(CHECKSUM_TABLE, dtype=numpy.uint8)
+    pids = numpy.frombuffer(PID_TABLE, dtype=numpy.uint8).astype(numpy.uint32)
+
+    classic = numpy.where(sums == 0, 0xff, table[sums % 255])
+    enhanced_sums = sums + pids[frameids]
+    enhanced = table[enhanced_sums % 255]
+
+    models = numpy.full(len(frameids), CHECKSUM_MODE_NONE, dtype=numpy.uint16)
+    models[checksums == classic] = CHECKSUM_MODE_LIN1
+    models[(checksums == enhanced) & (frameids < 0x3c)] = CHECKSUM_MODE_LIN2
+    models[checksums < 0] = CHECKSUM_MODE_NONE
+    return models
@@ -0,0 +1,134 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import collections
+
+class DeviceClock(object):
+    """
+    Unwraps the 16 bit millisecond timestamps of the device into a monotonic
+    64 bit device time and estimates the relation to the host clock. Use a
+    monotonic host clock (time.monotonic()), a step of the host clock would move
+    the unwrapped device time by whole wrap periods.
+
+    Every report is received some time after its timestamp was taken, so the
+    observed offset (host time - device time) is the true offset plus a
+    positive transport delay. The minimum offset of each window is therefore
+    a good sample of the true offset; a line fitted through the last minima
+    gives offset and drift.
+    """
+
+    def __init__(self, window = 2000, history = 16):
+        """
+        :param window: Length of one minimum window in device milliseconds
+        :type window: integer
+        :param history: Number of window minima used for the offset/drift fit
+        :type history: integer
+        """
+        self.window = window
+        self.last = None
+        self.time = 0
+        self.window_start = None
+        self.window_min = None
+        self.minima = collections.deque(maxlen=history)
+        self.offset = None
+        self.drift = 0.0
+        self.reference = 0
+
+    def unwrap(self, timestamp, hosttime = None):
+        """
+        Convert 16 bit device timestamp into monotonic device time.
+        :param timestamp: Device timestamp in milliseconds (16 bit)
+        :type timestamp: integer
+        :param hosttime: Host time of reception (used to resolve gaps longer than one wrap period)
+        :type hosttime: float
+        :rtype: integer
+        """
+        if self.last is None:
+            self.time = timestamp
+        elif hosttime is not None and self.offset is not None:
+            predicted = self.to_device(hosttime)
+            self.time = timestamp + ((int(predicted) - timestamp + 0x8000) & ~0xffff)
+        else:
+            delta = (timestamp - self.last) & 0xffff
+            if delta >= 0x8000:
+                delta -= 0x10000
+            self.time += delta
+        self.last = timestamp
+        return self.time
+
+    def update(self, devicetime, hosttime):
+        """
+        Add observation of device time and host time of reception.
+        :param devicetime: Unwrapped device time in milliseconds
+        :type devicetime: integer
+        :param hosttime: Host time in seconds
+        :type hosttime: float
+        """
+        offset = hosttime - devicetime * 1e-3
+        if self.window_start is None:
+            self.window_start = devicetime
+            self.window_min = (devicetime, offset)
+            self.offset = offset
+            self.reference = devicetime
+            return
+        if offset < self.window_min[1]:
+            self.window_min = (devicetime, offset)
+            if len(self.minima) < 2 and offset < self.offset:
+                self.offset = offset
+        if devicetime - self.window_start >= self.window:
+            self.minima.append(self.window_min)
+            self.window_start = devicetime
+            self.window_min = (devicetime, offset)
+            self.fit()
+
+    def fit(self):
+        """
+        Least squares fit through window minima.
+        """
+        n = len(self.minima)
+        if n < 2:
+            self.offset, self.reference = self.minima[0][1], self.minima[0][0]
+            return
+        reference = self.minima[-1][0]
+        mx = sum(d - reference for d, o in self.minima) / n
+        my = sum(o for d, o in self.minima) / n
+        sxx = sum((d - reference - mx) ** 2 for d, o in self.minima)
+        sxy = sum((d - reference - mx) * (o - my) for d, o in self.minima)
+        slope = sxy / sxx if sxx else 0.0
+        self.reference = reference
+        self.offset = my - slope * mx
+        self.drift = slope * 1e3
+
+    def to_host(self, devicetime):
+        """
+        Convert device time into estimated host time.
+        :param devicetime: Unwrapped device time in milliseconds
+        :type devicetime: integer
+        :rtype: float (seconds) or None if no estimate is available
+        """
+        if self.offset is None:
+            return None
+        return devicetime * 1e-3 + self.offset + (devicetime - self.reference) * 1e-3 * self.drift
+
+    def to_device(self, hosttime):
+        """
+        Convert host time into estimated device time.
+        :param hosttime: Host time in seconds
+        :type hosttime: float
+        :rtype: float (milliseconds)
+        """
+        return (hosttime - self.offset + self.reference * 1e-3 * self.drift) / (1e-3 * (1 + self.drift))
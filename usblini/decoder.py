@@ -0,0 +1,227 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+from bisect import bisect_left, bisect_right
+from .usblini import LINFrame
+from .checksum import PID_TABLE
+from .logic import SAMPLERATE, edges
+
+
+class SampledLINFrame(LINFrame):
+    """
+    Frame decoded from logic analyzer samples. Positions are sample indices (float
+    for positions derived from the measured bit time).
+    """
+
+    __slots__ = ('start', 'end', 'baudrate', 'error')
+
+    def __init__(self, frameid, data, checksum, start, end, baudrate, error = None):
+        LINFrame.__init__(self, frameid, data, checksum)
+        # falling edge of the break field
+        self.start = start
+        # end of the stop bit of the last byte
+        self.end = end
+        # baudrate measured on the sync field
+        self.baudrate = baudrate
+        # None or description of the problem ('parity', 'framing')
+        self.error = error
+
+
+class LINDecoder(object):
+    """
+    Decodes LIN frames from the sampled RX level. Use it as logic listener in
+    LOGIC_MODE_SAMPLES or feed recorded samples. Only the level changes are stored
+    and the bits are sampled by binary search in the edge list, so the work depends
+    on the number of edges, not on the number of samples.
+    """
+
+    # dominant level of at least 11 bit times is a break (LIN 2.x slave detection threshold)
+    BREAK_BITS = 11
+    # tolerance of the sync field edges in bit times
+    SYNC_TOLERANCE = 0.5
+
+    def __init__(self, callback, baudrate = None, samplerate = SAMPLERATE, tolerance = 0.15, maxgap = 30):
+        """
+        :param callback: Called with each decoded frame (SampledLINFrame)
+        :type callback: function
+        :param baudrate: Nominal baudrate in Hz (None: accept any baudrate measured on the sync field)
+        :type baudrate: integer
+        :param samplerate: Samplerate in Hz
+        :type samplerate: integer
+        :param tolerance: Maximal relative deviation of the measured baudrate from the nominal baudrate
+        :type tolerance: float
+        :param maxgap: Idle time in bit times after which a frame is considered complete
+        :type maxgap: integer
+        """
+        self.callback = callback
+        self.baudrate = baudrate
+        self.samplerate = samplerate
+        self.tolerance = tolerance
+        self.maxgap = maxgap
+        # shortest break in samples, based on the slowest supported baudrate if not given
+        self.breaklength = self.BREAK_BITS * samplerate / (baudrate * (1 + tolerance) if baudrate else 20000)
+        self.edges = []
+        self.levels = []
+        # level before the first stored edge, LIN bus is recessive (1) when idle
+        self.level = 1
+        # number of samples received
+        self.position = 0
+        self.frames = 0
+        self.errors = 0
+
+    def __call__(self, position, samples):
+        self.feed(samples)
+
+    def feed(self, samples):
+        """
+        Add samples (one byte 0/1 per sample) and decode all completed frames.
+        """
+        level = self.levels[-1] if self.levels else self.level
+        changes = edges(samples, level)
+        changes = changes if isinstance(changes, list) else changes.tolist()
+        position = self.position
+        self.edges.extend(i + position for i in changes)
+        for i in range(len(changes)):
+            level ^= 1
+            self.levels.append(level)
+        self.position += len(samples)
+        self.process()
+
+    def flush(self):
+        """
+        Decode a frame still waiting for more samples (e.g. at the end of a recording).
+        """
+        self.position += int(self.maxgap * self.samplerate / (self.baudrate or 2400)) + 1
+        self.process()
+
+    def level_at(self, t):
+        i = bisect_right(self.edges, t) - 1
+        return self.levels[i] if i >= 0 else self.level
+
+    def next_falling(self, t):
+        """
+        Index of the first falling edge at or after sample position t, None if not received yet.
+        """
+        i = bisect_left(self.edges, t)
+        if i < len(self.levels) and self.levels[i] == 1:
+            i += 1
+        return i if i < len(self.edges) else None
+
+    def process(self):
+        k = 0
+        while True:
+            status, k = self.decode_frame(k)
+            if status is None:
+                break
+        if k:
+            self.level = self.levels[k - 1]
+            del self.edges[:k]
+            del self.levels[:k]
+
+    def decode_frame(self, k):
+        """
+        Try to decode a frame beginning with edge k.
+        :return: (None, k) if more samples are needed, (True, index of the next edge to look at) otherwise
+        """
+        edges = self.edges
+        levels = self.levels
+        if k >= len(edges):
+            return None, k
+        if levels[k] != 0:
+            return True, k + 1
+        # break: long dominant level, wait for its end
+        if k + 1 >= len(edges):
+            return None, k
+        if edges[k + 1] - edges[k] < self.breaklength:
+            return True, k + 1
+        # sync field 0x55: 10 equally spaced edges beginning with the start bit
+        s = k + 2
+        if s + 9 >= len(edges):
+            if self.position - edges[k + 1] < 2 * self.breaklength:
+                return None, k
+            return True, k + 1
+        bittime = (edges[s + 8] - edges[s]) / 8.0
+        if not all(abs(edges[s + j] - edges[s] - j * bittime) <= self.SYNC_TOLERANCE * bittime for j in range(10)):
+            return True, k + 1
+        baudrate = self.samplerate / bittime
+        if self.baudrate and abs(baudrate - self.baudrate) > self.tolerance * self.baudrate:
+            return True, k + 1
+
+        received = []
+        start = edges[s]
+        error = None
+        nextk = s + 9
+        while len(received) < 10:
+            # next start bit after the stop bit of the previous byte
+            j = self.next_falling(start + 9.5 * bittime)
+            if j is None:
+                if self.position - (start + 10 * bittime) < self.maxgap * bittime:
+                    return None, k
+                break
+            if edges[j] - (start + 10 * bittime) > self.maxgap * bittime:
+                nextk = j
+                break
+            byte_start = edges[j]
+            if self.position <= byte_start + 9.5 * bittime:
+                return None, k
+            value = 0
+            for i in range(8):
+                value |= self.level_at(byte_start + (1.5 + i) * bittime) << i
+            if not self.level_at(byte_start + 9.5 * bittime):
+                # framing error, probably the break of the next frame
+                if not received:
+                    error = 'framing'
+                nextk = j
+                break
+            received.append(value)
+            start = byte_start
+            nextk = j + 1
+
+        if not received:
+            self.errors += 1
+            return True, max(nextk, k + 1)
+        pid = received[0]
+        response = bytes(received[1:])
+        if len(response) > 1:
+            data, checksum = response[:-1], response[-1]
+        else:
+            data, checksum = response, None
+        if PID_TABLE[pid & 0x3f] != pid:
+            error = 'parity'
+            self.errors += 1
+        frame = SampledLINFrame(pid & 0x3f, data, checksum, edges[k], start + 10 * bittime, baudrate, error)
+        self.frames += 1
+        self.callback(frame)
+        return True, nextk
+
+def decode_samples(samples, baudrate = None, samplerate = SAMPLERATE, chunksize = 1 << 20):
+    """
+    Decode all frames of recorded samples. The samples are fed in chunks, so only the
+    edges of the frame being decoded are kept, also for hour-long recordings.
+    :param samples: Samples (one byte 0/1 per sample)
+    :param baudrate: Nominal baudrate in Hz (None: measured on the sync field)
+    :type baudrate: integer
+    :param chunksize: Number of samples fed to the decoder at once
+    :type chunksize: integer
+    :rtype: list(SampledLINFrame)
+    """
+    frames = []
+    decoder = LINDecoder(frames.append, baudrate, samplerate)
+    for start in range(0, len(samples), chunksize):
+        decoder.feed(samples[start:start + chunksize])
+    decoder.flush()
+    return frames
@@ -0,0 +1,402 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import re
+from .usblini import USBliniError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TOKEN_RE = re.compile(r'''
+    (?P<skip>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<string>"[^"]*")
+  | (?P<number>[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?))
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<punct>[{}:;,=])
+''', re.VERBOSE | re.DOTALL)
+
+class LDFError(USBliniError):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+class LDFString(str):
+    """ Quoted string of the LDF (distinguishes "text" from identifiers) """
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        m = TOKEN_RE.match(text, pos)
+        if m is None:
+            raise LDFError("ERROR: invalid character in LDF at position {}: {!r}".format(pos, text[pos:pos + 20]))
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'string':
+            tokens.append(LDFString(value[1:-1]))
+        elif kind == 'number':
+            if value.lower().lstrip('+-').startswith('0x'):
+                tokens.append(int(value, 16))
+            elif re.match(r'^[-+]?\d+$', value):
+                tokens.append(int(value))
+            else:
+                tokens.append(float(value))
+        elif kind != 'skip':
+            tokens.append(value)
+    return tokens
+
+def parse_block(tokens, pos):
+    """
+    Parse statements up to the closing brace (or end of input). A statement is a list of
+    tokens; nested braces become a list of statements. A statement ends with ';' or
+    with a closing brace which is not followed by ',' or ';'.
+    :return: list of statements and position after the block
+    """
+    items = []
+    statement = []
+    while pos < len(tokens):
+        token = tokens[pos]
+        pos += 1
+        if token == '}':
+            if statement:
+                items.append(statement)
+            return items, pos
+        elif token == ';':
+            items.append(statement)
+            statement = []
+        elif token == '{':
+            child, pos = parse_block(tokens, pos)
+            statement.append(child)
+            if pos >= len(tokens) or tokens[pos] not in (',', ';'):
+                items.append(statement)
+                statement = []
+        else:
+            statement.append(token)
+    if statement:
+        items.append(statement)
+    return items, pos
+
+def split_commas(statement):
+    fields = [[]]
+    for token in statement:
+        if token == ',':
+            fields.append([])
+        else:
+            fields[-1].append(token)
+    return [f[0] if len(f) == 1 else f for f in fields]
+
+
+class LDFSignal(object):
+
+    def __init__(self, name, size, init_value, publisher, subscribers):
+        self.name = name
+        self.size = size
+        self.init_value = init_value
+        self.publisher = publisher
+        self.subscribers = subscribers
+        self.encoding = None
+
+    def is_array(self):
+        return isinstance(self.init_value, list)
+
+class LDFFrame(object):
+
+    def __init__(self, name, frameid, publisher, length, signals):
+        self.name = name
+        self.frameid = frameid
+        self.publisher = publisher
+        self.length = length
+        # list of (bit offset, LDFSignal)
+        self.signals = signals
+
+class LDFEncoding(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.logical = {}
+        # list of (min, max, scale, offset, unit)
+        self.physical = []
+
+    def decode(self, raw):
+        """
+        Convert raw value into physical value or logical text.
+        """
+        text = self.logical.get(raw)
+        if text is not None:
+            return text
+        for minimum, maximum, scale, offset, unit in self.physical:
+            if minimum <= raw <= maximum:
+                return raw * scale + offset
+        return raw
+
+
+class FrameDecoder(object):
+    """
+    Decoder of one frame compiled from the LDF: shifts, masks, scaling and encoding
+    tables of all signals are precomputed.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.frameid = frame.frameid
+        self.scalars = []
+        self.arrays = []
+        for offset, signal in frame.signals:
+            if signal.is_array():
+                self.arrays.append((signal.name, offset // 8, (offset + signal.size) // 8))
+                continue
+            encoding = signal.encoding
+            logical = dict(encoding.logical) if encoding is not None else {}
+            physical = list(encoding.physical) if encoding is not None else []
+            if not logical and len(physical) == 1:
+                # single linear range, the common case
+                minimum, maximum, scale, offset_value, unit = physical[0]
+                self.scalars.append((signal.name, offset, (1 << signal.size) - 1, None, minimum, maximum, scale, offset_value))
+            elif logical or physical:
+                self.scalars.append((signal.name, offset, (1 << signal.size) - 1, encoding.decode, 0, 0, 1, 0))
+            else:
+                self.scalars.append((signal.name, offset, (1 << signal.size) - 1, None, None, None, 1, 0))
+
+    def decode(self, frame):
+        """
+        Decode frame into dictionary of signal names and physical values (or logical texts).
+        :param frame: Received frame or its data bytes
+        :type frame: LINFrame or bytes
+        :rtype: dict
+        """
+        data = getattr(frame, 'data', frame)
+        raw = int.from_bytes(bytes(data), 'little')
+        values = {}
+        for name, shift, mask, decode, minimum, maximum, scale, offset in self.scalars:
+            value = (raw >> shift) & mask
+            if decode is not None:
+                value = decode(value)
+            elif minimum is not None and minimum <= value <= maximum:
+                value = value * scale + offset
+            values[name] = value
+        for name, start, end in self.arrays:
+            values[name] = bytes(data[start:end])
+        return values
+
+    def decode_array(self, data):
+        """
+        Decode many frames at once (requires NumPy). Logical values are returned as raw
+        numbers, physical values outside all ranges are returned unscaled.
+        :param data: Frame data, shape (n, 8) of uint8 (e.g. records['data'] of a FrameCapture)
+        :type data: numpy.ndarray
+        :return: Dictionary of signal names and arrays of values
+        :rtype: dict
+        """
+        if numpy is None:
+            raise LDFError("ERROR: vectorized decoding requires NumPy")
+        data = numpy.ascontiguousarray(data, dtype=numpy.uint8)
+        padded = numpy.zeros((len(data), 8), dtype=numpy.uint8)
+        padded[:, :data.shape[1]] = data
+        raw = padded.view('<u8')[:, 0]
+        values = {}
+        for name, shift, mask, decode, minimum, maximum, scale, offset in self.scalars:
+            value = (raw >> numpy.uint64(shift)) & numpy.uint64(mask)
+            if decode is not None:
+                encoding = self.encoding_of(name)
+                result = value.astype(numpy.float64)
+                for minimum, maximum, scale, offset, unit in reversed(encoding.physical):
+                    inrange = (value >= minimum) & (value <= maximum)
+                    result[inrange] = value[inrange] * scale + offset
+                for logical in encoding.logical:
+                    result[value == logical] = logical
+                value = result
+            elif minimum is not None:
+                inrange = (value >= minimum) & (value <= maximum)
+                value = value.astype(numpy.float64)
+                value = numpy.where(inrange, value * scale + offset, value)
+            values[name] = value
+        for name, start, end in self.arrays:
+            values[name] = padded[:, start:end]
+        return values
+
+    def encoding_of(self, name):
+        for offset, signal in self.frame.signals:
+            if signal.name == name:
+                return signal.encoding
+
+
+class LDF(object):
+    """
+    Content of a LIN Description File.
+    """
+
+    def __init__(self):
+        self.protocol_version = None
+        self.speed = None
+        self.master = None
+        self.slaves = []
+        self.signals = {}
+        self.frames = {}
+        self.encodings = {}
+        self.schedule_tables = {}
+        self.decoders = {}
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Load LDF from file.
+        :param filename: Path of the LDF
+        :type filename: string
+        :rtype: LDF
+        """
+        with open(filename, 'r') as f:
+            return cls.from_string(f.read())
+
+    @classmethod
+    def from_string(cls, text):
+        """
+        Parse LDF text.
+        :rtype: LDF
+        """
+        ldf = cls()
+        items, pos = parse_block(tokenize(text), 0)
+        for item in items:
+            if len(item) >= 3 and item[1] == '=':
+                ldf.parse_assignment(item[0], item[2:])
+            elif len(item) == 2 and isinstance(item[1], list):
+                parser = getattr(ldf, 'parse_' + item[0].lower(), None)
+                if parser is not None:
+                    parser(item[1])
+        ldf.compile()
+        return ldf
+
+    def parse_assignment(self, name, value):
+        if name == 'LIN_protocol_version':
+            self.protocol_version = value[0]
+        elif name == 'LIN_speed':
+            speed = value[0]
+            if len(value) > 1 and value[1] == 'kbps':
+                speed = speed * 1000
+            self.speed = int(round(speed))
+
+    def parse_nodes(self, items):
+        for item in items:
+            if item[:2] == ['Master', ':']:
+                self.master = item[2]
+            elif item[:2] == ['Slaves', ':']:
+                self.slaves = [s for s in split_commas(item[2:]) if s != []]
+
+    def parse_signals(self, items):
+        for item in items:
+            if len(item) < 3 or item[1] != ':':
+                continue
+            fields = split_commas(item[2:])
+            size, init_value, publisher = fields[0], fields[1], fields[2]
+            if isinstance(init_value, list):
+                # byte array signal: init value is a nested block {b0, b1, ...}
+                init_value = [v for v in split_commas(init_value[0]) if v != []] if init_value else []
+            self.signals[item[0]] = LDFSignal(item[0], size, init_value, publisher, fields[3:])
+
+    def parse_frames(self, items):
+        for item in items:
+            if len(item) < 3 or item[1] != ':' or not isinstance(item[-1], list):
+                continue
+            fields = split_commas(item[2:-1])
+            frameid, publisher, length = fields[0], fields[1], fields[2]
+            signals = []
+            for entry in item[-1]:
+                name, offset = split_commas(entry)[:2]
+                if name not in self.signals:
+                    raise LDFError("ERROR: frame {} uses unknown signal {}".format(item[0], name))
+                signals.append((offset, self.signals[name]))
+            self.frames[item[0]] = LDFFrame(item[0], frameid, publisher, length, signals)
+
+    def parse_schedule_tables(self, items):
+        for item in items:
+            if len(item) != 2 or not isinstance(item[1], list):
+                continue
+            entries = []
+            for entry in item[1]:
+                # master commands (AssignNAD {...} etc.) are kept as (None, delay) for their slot time
+                if 'delay' not in entry or entry.index('delay') + 1 >= len(entry):
+                    continue
+                i = entry.index('delay')
+                entries.append((entry[0] if i == 1 else None, entry[i + 1]))
+            self.schedule_tables[item[0]] = entries
+
+    def parse_signal_encoding_types(self, items):
+        for item in items:
+            if len(item) != 2 or not isinstance(item[1], list):
+                continue
+            encoding = LDFEncoding(item[0])
+            for entry in item[1]:
+                fields = split_commas(entry)
+                if fields[0] == 'logical_value':
+                    encoding.logical[fields[1]] = fields[2] if len(fields) > 2 else None
+                elif fields[0] == 'physical_value':
+                    unit = fields[5] if len(fields) > 5 else None
+                    encoding.physical.append((fields[1], fields[2], fields[3], fields[4], unit))
+            self.encodings[item[0]] = encoding
+
+    def parse_signal_representation(self, items):
+        for item in items:
+            if len(item) < 3 or item[1] != ':':
+                continue
+            encoding = self.encodings.get(item[0])
+            for name in split_commas(item[2:]):
+                if name in self.signals:
+                    self.signals[name].encoding = encoding
+
+    def compile(self):
+        """
+        Compile decoders of all frames.
+        """
+        self.decoders = {frame.frameid: FrameDecoder(frame) for frame in self.frames.values()}
+
+    def frame_by_id(self, frameid):
+        """
+        :rtype: LDFFrame or None
+        """
+        decoder = self.decoders.get(frameid)
+        return decoder.frame if decoder is not None else None
+
+    def decode(self, frame):
+        """
+        Decode received frame into dictionary of signal names and physical values.
+        :param frame: Received frame
+        :type frame: LINFrame
+        :rtype: dict or None if the frame is not defined in the LDF
+        """
+        decoder = self.decoders.get(frame.frameid)
+        if decoder is None:
+            return None
+        return decoder.decode(frame)
+
+    def decode_records(self, records):
+        """
+        Decode captured frames (e.g. FrameCapture.get()) at once, grouped by frame.
+        :param records: Captured frames with fields frameid and data
+        :type records: numpy.ndarray
+        :return: Dictionary frame name -> (indices of the records, dictionary of signal arrays)
+        :rtype: dict
+        """
+        if numpy is None:
+            raise LDFError("ERROR: vectorized decoding requires NumPy")
+        result = {}
+        frameids = records['frameid']
+        for frameid, decoder in self.decoders.items():
+            indices = numpy.flatnonzero(frameids == frameid)
+            if len(indices):
+                result[decoder.frame.name] = (indices, decoder.decode_array(records['data'][indices]))
+        return result
@@ -0,0 +1,260 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import re
+import queue
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# RX pin is sampled with 100 ksps, 8 samples per byte (first sample in MSB)
+SAMPLERATE = 100000
+
+# translates the characters of a binary string into sample bytes
+BINARY_TO_SAMPLES = bytes.maketrans(b'01', b'\x00\x01')
+EDGE_RE = re.compile(b'(?=\x00\x01|\x01\x00)')
+
+def expand(data):
+    """
+    Expand packed logic data into one byte per sample (0x00 or 0x01).
+    :param data: Packed samples as received on EP2
+    :type data: bytes
+    :return: Samples, numpy.ndarray of uint8 if NumPy is available, bytes otherwise
+    """
+    if numpy is not None:
+        return numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))
+    if not data:
+        return b''
+    return format(int.from_bytes(data, 'big'), '0{}b'.format(8 * len(data))).encode('ascii').translate(BINARY_TO_SAMPLES)
+
+def edges(samples, level = None):
+    """
+    Find level changes.
+    :param samples: Samples (one byte per sample)
+    :param level: Level before the first sample (None: unknown, no edge at the first sample)
+    :type level: integer
+    :return: Indices of the samples where the level changed, numpy.ndarray if NumPy is available, list otherwise
+    """
+    if numpy is not None:
+        samples = numpy.frombuffer(samples, dtype=numpy.uint8) if not isinstance(samples, numpy.ndarray) else samples
+        if level is None:
+            return numpy.flatnonzero(numpy.diff(samples)) + 1
+        return numpy.flatnonzero(numpy.diff(samples, prepend=numpy.uint8(level)))
+    samples = bytes(samples)
+    result = [m.start() + 1 for m in EDGE_RE.finditer(samples)]
+    if level is not None and samples and samples[0] != level:
+        result.insert(0, 0)
+    return result
+
+
+class LogicSampler(object):
+    """
+    Logic listener which expands the packed EP2 data and keeps the sample position and
+    level across buffers.
+    """
+
+    MODE_SAMPLES = 1
+    MODE_EDGES =   2
+
+    def __init__(self, callback, mode = MODE_SAMPLES):
+        """
+        :param callback: MODE_SAMPLES: called with (index of first sample, samples),
+                         MODE_EDGES: called with (sample indices of level changes, level before the first change)
+        :type callback: function
+        :param mode: MODE_SAMPLES or MODE_EDGES
+        :type mode: integer
+        """
+        self.callback = callback
+        self.mode = mode
+        # number of samples received so far
+        self.position = 0
+        # level of the last received sample, LIN bus is recessive (1) when idle
+        self.level = 1
+
+    def __call__(self, data):
+        samples = expand(data)
+        position = self.position
+        self.position += len(samples)
+        if self.mode == self.MODE_SAMPLES:
+            self.callback(position, samples)
+            return
+        level = self.level
+        changes = edges(samples, level)
+        if len(samples):
+            self.level = samples[-1]
+        if len(changes):
+            self.callback(changes + position if numpy is not None else [i + position for i in changes], level)
+
+
+class TriggeredCapture(threading.Thread):
+    """
+    Logic listener (LOGIC_MODE_RAW) keeping the packed samples in a fixed size ring
+    buffer. When the trigger fires, the window from pretrigger samples before to
+    posttrigger samples after the trigger is handed to the callback, which is called
+    from a background thread so saving the window doesn't stall the USB thread.
+    Memory use is constant, so the capture can stay armed for days.
+    """
+
+    def __init__(self, callback, pretrigger, posttrigger, pattern = None, dominant = None, rearm = True,
+                 margin = 4096, queuesize = 4, frameids = None):
+        """
+        :param callback: Called with (index of first sample, samples with one byte 0/1 per sample, index of trigger sample)
+        :type callback: function
+        :param pretrigger: Number of samples before the trigger
+        :type pretrigger: integer
+        :param posttrigger: Number of samples after the trigger
+        :type posttrigger: integer
+        :param pattern: Trigger on this sample sequence, e.g. '10' for a falling edge (None: no pattern trigger)
+        :type pattern: string
+        :param dominant: Trigger if the level is dominant (0) for this number of samples (None: no level trigger)
+        :type dominant: integer
+        :param rearm: Arm again after a window was handed over
+        :type rearm: bool
+        :param margin: Additional ring buffer bytes for the buffer which completes the window (at least one EP2 transfer)
+        :type margin: integer
+        :param queuesize: Number of windows waiting for the callback before further windows are dropped
+        :type queuesize: integer
+        :param frameids: LIN frame identifier(s) whose frames fire the trigger (see frame_listener)
+        :type frameids: integer or list(int)
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.callback = callback
+        self.pretrigger = pretrigger
+        self.posttrigger = posttrigger
+        self.needles = []
+        if pattern is not None:
+            self.needles.append(bytes(pattern, 'ascii').translate(BINARY_TO_SAMPLES) if isinstance(pattern, str) else bytes(pattern))
+        if dominant is not None:
+            self.needles.append(b'\x00' * dominant)
+        self.rearm = rearm
+        self.frameids = frameids
+        self.size = (pretrigger + posttrigger + 7) // 8 + 1 + margin
+        self.ring = bytearray(self.size)
+        # number of packed bytes received
+        self.written = 0
+        # last samples of the previous buffer, to find triggers across buffer boundaries
+        self.tail = b''
+        self.lock = threading.Lock()
+        self.armed = True
+        # sample index of the pending trigger
+        self.triggerposition = None
+        self.triggers = 0
+        self.dropped = 0
+        self.queue = queue.Queue(queuesize)
+        self.start()
+
+    @property
+    def position(self):
+        return self.written * 8
+
+    def __call__(self, data):
+        data = bytes(data)
+        if self.armed and self.needles and self.triggerposition is None:
+            self.search(data)
+        self.append(data)
+        with self.lock:
+            trigger = self.triggerposition
+        if trigger is not None and self.position >= trigger + self.posttrigger:
+            self.complete(trigger)
+
+    def search(self, data):
+        samples = expand(data)
+        samples = samples if isinstance(samples, bytes) else samples.tobytes()
+        haystack = self.tail + samples
+        found = [haystack.find(needle) for needle in self.needles]
+        found = [(i + len(needle) - 1) for i, needle in zip(found, self.needles) if i >= 0]
+        if found:
+            self.trigger(self.position - len(self.tail) + min(found))
+        keep = max(len(needle) for needle in self.needles) - 1
+        self.tail = haystack[len(haystack) - keep:] if keep else b''
+
+    def append(self, data):
+        if len(data) > self.size:
+            self.written += len(data) - self.size
+            data = data[-self.size:]
+        offset = self.written % self.size
+        first = min(len(data), self.size - offset)
+        self.ring[offset:offset + first] = data[:first]
+        self.ring[:len(data) - first] = data[first:]
+        self.written += len(data)
+
+    def trigger(self, position = None):
+        """
+        Fire the trigger (e.g. from a frame listener). Ignored if not armed or a window is pending.
+        :param position: Index of the trigger sample (None: the last received sample)
+        :type position: integer
+        """
+        with self.lock:
+            if not self.armed or self.triggerposition is not None:
+                return
+            self.triggerposition = self.position if position is None else position
+            self.triggers += 1
+
+    def frame_listener(self, frame):
+        """
+        Frame listener firing the trigger.
+        """
+        self.trigger()
+
+    def arm(self):
+        with self.lock:
+            self.armed = True
+            self.triggerposition = None
+            self.tail = b''
+
+    def complete(self, trigger):
+        """
+        Copy the window out of the ring buffer and hand it to the callback thread.
+        """
+        start = max(trigger - self.pretrigger, (self.written - self.size) * 8, 0)
+        end = trigger + self.posttrigger
+        first, last = start // 8, (end + 7) // 8
+        samples = expand(self.read(first, last))[start - first * 8:end - first * 8]
+        try:
+            self.queue.put_nowait((start, samples, trigger))
+        except queue.Full:
+            self.dropped += 1
+        with self.lock:
+            self.triggerposition = None
+            self.armed = self.rearm
+            self.tail = b''
+
+    def read(self, first, last):
+        first, last = first % self.size, first % self.size + (last - first)
+        if last <= self.size:
+            return bytes(self.ring[first:last])
+        return bytes(self.ring[first:]) + bytes(self.ring[:last - self.size])
+
+    def run(self):
+        while True:
+            window = self.queue.get()
+            if window is None:
+                return
+            self.callback(*window)
+
+    def close(self):
+        """
+        Disarm and stop the callback thread after the pending windows were handed over.
+        """
+        with self.lock:
+            self.armed = False
+        self.queue.put(None)
+        self.join()
@@ -0,0 +1,135 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import usb1
+import threading
+from .usblini import USBlini
+from .usblini import USBliniError
+from .usblini import USBliniNotFoundError
+from .usblini import USBliniUSBEventHandler
+
+class USBliniManager(object):
+    """
+    Drive several USBlini adapters from one libusb context and one USB event thread.
+    """
+
+    def __init__(self):
+        """ Initialze """
+
+        self.ctx = usb1.USBContext()
+        self.ctx.open()
+        self.devices = {}
+        self.adapters = {}
+        self.relays = {}
+        self.frame_listeners = []
+        self.lock = threading.Lock()
+        self.eventthread = None
+
+    def enumerate(self):
+        """
+        Enumerate the bus once and remember all USBlini devices.
+        :return: Serial numbers of the found adapters
+        :rtype: list(string)
+        """
+        devices = {}
+        for device in self.ctx.getDeviceIterator(skip_on_error=True):
+            if device.getVendorID() == USBlini.USB_VID and device.getProductID() == USBlini.USB_PID:
+                try:
+                    devices[device.getSerialNumber()] = device
+                except usb1.USBErrorAccess:
+                    pass
+        self.devices = devices
+        return sorted(devices)
+
+    def open(self, serialnumber, tag = None, **kwargs):
+        """
+        Open adapter with given serial number on the shared context.
+        :param serialnumber: USB serial number
+        :type serialnumber: string
+        :param tag: Tag passed to merged frame listeners (default: serial number)
+        :param kwargs: Further arguments passed to USBlini.open
+        :rtype: USBlini
+        """
+        if serialnumber not in self.devices:
+            self.enumerate()
+        if serialnumber not in self.devices:
+            raise USBliniNotFoundError("USBlini {} not found. Please check connection - no charge-only USB cable?".format(serialnumber))
+        if tag is None:
+            tag = serialnumber
+        if tag in self.adapters:
+            raise USBliniError("ERROR: adapter tag already in use")
+
+        lini = USBlini(self.ctx)
+        lini.open(serialnumber, device=self.devices[serialnumber], **kwargs)
+        with self.lock:
+            self.adapters[tag] = lini
+            self.relays[tag] = self.frame_relay(tag)
+            if self.frame_listeners:
+                lini.frame_listener_add(self.relays[tag])
+
+        if self.eventthread is None:
+            self.eventthread = USBliniUSBEventHandler(self.ctx)
+            self.eventthread.start()
+        return lini
+
+    def close(self):
+        """
+        Close all adapters and the shared context.
+        """
+        for lini in list(self.adapters.values()):
+            lini.close()
+        self.adapters = {}
+        self.relays = {}
+        if self.eventthread is not None:
+            self.eventthread.stop()
+            self.ctx.interruptEventHandler()
+            self.eventthread.join()
+            self.eventthread = None
+        self.ctx.close()
+
+    def frame_relay(self, tag):
+        def relay(frame):
+            for listener in self.frame_listeners:
+                listener(tag, frame)
+        return relay
+
+    def frame_listener_add(self, func):
+        """
+        Add a listener for the merged frame stream of all adapters. It is called with
+        the adapter tag and the frame: func(tag, frame)
+        :param func: Function to add to listener list
+        :type func: function
+        """
+        with self.lock:
+            if not self.frame_listeners:
+                for tag, lini in self.adapters.items():
+                    lini.frame_listener_add(self.relays[tag])
+            self.frame_listeners = self.frame_listeners + [func]
+
+    def frame_listener_remove(self, func):
+        """
+        Remove given function from listeners list
+        :param func: Function to remove from listener list
+        :type func: function
+        """
+        with self.lock:
+            if func not in self.frame_listeners:
+                raise USBliniError("ERROR: failed to remove frame listener")
+            self.frame_listeners = [l for l in self.frame_listeners if l != func]
+            if not self.frame_listeners:
+                for tag, lini in self.adapters.items():
+                    lini.frame_listener_remove(self.relays[tag])
@@ -0,0 +1,112 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+class LatencyHistogram(object):
+    """
+    Histogram with power of two buckets in microseconds. Bucket n counts
+    durations below 2^n us (bucket 0: below 1 us).
+    """
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        """
+        Add a duration.
+        :param duration: Duration in seconds
+        :type duration: float
+        """
+        self.buckets[min(int(duration * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def snapshot(self):
+        """
+        Get copy of the histogram with derived values (durations in seconds).
+        :rtype: dict
+        """
+        buckets = list(self.buckets)
+        count = sum(buckets)
+        return {'count': count,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max,
+                'p50': self.percentile(buckets, count, 0.5),
+                'p99': self.percentile(buckets, count, 0.99),
+                'buckets': buckets}
+
+    @staticmethod
+    def percentile(buckets, count, fraction):
+        """
+        Upper bound of the bucket containing the given fraction of all samples.
+        """
+        if count == 0:
+            return 0.0
+        limit = count * fraction
+        seen = 0
+        for n, c in enumerate(buckets):
+            seen += c
+            if seen >= limit:
+                return (1 << n) * 1e-6
+        return (1 << (len(buckets) - 1)) * 1e-6
+
+
+class USBliniMetrics(object):
+    """
+    Counters and latency histograms of one USBlini instance. Written by the USB
+    event thread (or dispatcher), snapshots can be taken from any thread.
+    """
+
+    TYPE_NAMES = {0x00: 'status', 0x01: 'error', 0x02: 'frame'}
+    SOURCE_NAMES = {0x00: 'common', 0x10: 'master', 0x20: 'slave', 0x30: 'user'}
+
+    def __init__(self):
+        self.reports = [0] * 256
+        self.logic_bytes = 0
+        self.ep1_callback = LatencyHistogram()
+        self.ep2_callback = LatencyHistogram()
+        self.frame_listeners = LatencyHistogram()
+        self.statusreport_listeners = LatencyHistogram()
+        self.logic_listeners = LatencyHistogram()
+        self.master_write = LatencyHistogram()
+
+    def snapshot(self):
+        """
+        Get copy of all counters and histograms.
+        :rtype: dict
+        """
+        reports = {}
+        for header, count in enumerate(list(self.reports)):
+            if count:
+                name = '{}/{}'.format(self.TYPE_NAMES.get(header & 0x0f, hex(header & 0x0f)),
+                                      self.SOURCE_NAMES.get(header & 0xf0, hex(header & 0xf0)))
+                reports[name] = reports.get(name, 0) + count
+        return {'reports': reports,
+                'errors': sum(c for n, c in reports.items() if n.startswith('error/')),
+                'logic_bytes': self.logic_bytes,
+                'ep1_callback': self.ep1_callback.snapshot(),
+                'ep2_callback': self.ep2_callback.snapshot(),
+                'frame_listeners': self.frame_listeners.snapshot(),
+                'statusreport_listeners': self.statusreport_listeners.snapshot(),
+                'logic_listeners': self.logic_listeners.snapshot(),
+                'master_write': self.master_write.snapshot()}
@@ -0,0 +1,229 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import math
+from .usblini import USBliniError
+
+DEFAULT_BAUDRATE = 19200
+DEFAULT_LENGTH = 8
+# LIN specification: maximal frame time is 1.4 times the nominal frame time
+FRAME_TIME_FACTOR = 1.4
+# the device takes period and frame time as 16 bit milliseconds
+MAX_PERIOD = 0xffff
+
+def frame_bits(length):
+    """
+    Nominal number of bits of a frame: break, sync and protected identifier (34 bits)
+    plus data bytes and checksum (10 bits each).
+    """
+    return 34 + 10 * (length + 1)
+
+def frame_time(length, baudrate = DEFAULT_BAUDRATE, factor = FRAME_TIME_FACTOR):
+    """
+    Time of one frame in milliseconds.
+    :param length: Number of data bytes
+    :type length: integer
+    :param baudrate: Baudrate in Hz
+    :type baudrate: integer
+    :param factor: 1.4 for the maximal frame time (slot time), 1.0 for the nominal frame time
+    :type factor: float
+    :rtype: float
+    """
+    return factor * frame_bits(length) * 1000.0 / baudrate
+
+def lcm(a, b):
+    return a * b // math.gcd(a, b)
+
+
+class CompiledSchedule(object):
+    """
+    Master sequence compiled from frame periods.
+    """
+
+    def __init__(self, period, frametime, sequence, busload):
+        self.period = period
+        self.frametime = frametime
+        self.sequence = sequence
+        # share of the bus occupied by nominal frame times (0..1)
+        self.busload = busload
+
+    def __repr__(self):
+        return 'CompiledSchedule({}, {}, [{}], busload={:.1%})'.format(
+            self.period, self.frametime, ', '.join(hex(x) for x in self.sequence), self.busload)
+
+    def as_tuple(self):
+        return (self.period, self.frametime, list(self.sequence))
+
+
+def divisors(n):
+    return [d for d in range(1, n + 1) if n % d == 0]
+
+def place(periods, order, period, frametime):
+    """
+    Place the frame identifiers on the slot grid of the given slot time. Every
+    identifier gets every n-th slot from a fixed offset, with the largest n which
+    divides the number of slots and doesn't exceed its period.
+    :return: list of slots (frame identifier or None), None if the identifiers don't fit
+    """
+    count = period // frametime
+    slots = [None] * count
+    for frameid in sorted(periods, key=lambda frameid: (periods[frameid], order[frameid])):
+        positions = None
+        for step in range(periods[frameid] // frametime, 0, -1):
+            if count % step:
+                continue
+            for offset in range(step):
+                if all(slots[i] is None for i in range(offset, count, step)):
+                    positions = range(offset, count, step)
+                    break
+            if positions is not None:
+                break
+        if positions is None:
+            return None
+        for i in positions:
+            slots[i] = frameid
+    return slots
+
+def max_gaps(sequence, slots):
+    """
+    Largest number of slots between two requests of each frame identifier (the
+    sequence repeats after the given number of slots).
+    :rtype: dict(int, int)
+    """
+    positions = {}
+    for i, frameid in enumerate(sequence):
+        positions.setdefault(frameid, []).append(i)
+    return {frameid: max(b - a for a, b in zip(p, p[1:] + [p[0] + slots])) for frameid, p in positions.items()}
+
+def compile_schedule(periods, baudrate = DEFAULT_BAUDRATE, lengths = None, frametime = None):
+    """
+    Compile frame periods into the minimal repeating master sequence. The device sends
+    the identifiers of the sequence with one fixed slot time and waits for the rest of
+    the period, so the period of the sequence is the least common multiple of all
+    periods, divided into slots. Every identifier is requested in equidistant slots at
+    least once per its period. The device can't leave a slot empty, so free slots between scheduled
+    frames are filled with additional requests of the identifier with the shortest
+    period. Each identifier is requested at least once per period, otherwise
+    USBliniError is raised.
+    :param periods: Period in milliseconds per LIN frame identifier, identifiers with the same period are placed in this order
+    :type periods: dict(int, int)
+    :param baudrate: Baudrate in Hz
+    :type baudrate: integer
+    :param lengths: Number of data bytes per LIN frame identifier (default: 8)
+    :type lengths: dict(int, int)
+    :param frametime: Slot time in milliseconds, must divide the period (default: as long as possible)
+    :type frametime: integer
+    :rtype: CompiledSchedule
+    """
+    lengths = lengths or {}
+    if not periods:
+        return CompiledSchedule(0, 0, [], 0.0)
+    if not all(0 <= frameid < 64 for frameid in periods):
+        raise USBliniError("ERROR: invalid LIN frame identifier")
+    if not all(isinstance(p, int) and p > 0 for p in periods.values()):
+        raise USBliniError("ERROR: frame periods must be positive integers (milliseconds)")
+
+    period = 1
+    for p in periods.values():
+        period = lcm(period, p)
+    if period > MAX_PERIOD:
+        raise USBliniError("ERROR: schedule period of {} ms is too long".format(period))
+
+    slottime = int(math.ceil(max(frame_time(lengths.get(frameid, DEFAULT_LENGTH), baudrate) for frameid in periods)))
+    if frametime is None:
+        candidates = [d for d in reversed(divisors(period)) if d >= slottime]
+    elif frametime < slottime:
+        raise USBliniError("ERROR: frame time too short, at least {} ms needed".format(slottime))
+    elif period % frametime:
+        raise USBliniError("ERROR: frame time must divide the schedule period of {} ms".format(period))
+    else:
+        candidates = [frametime]
+
+    order = {frameid: i for i, frameid in enumerate(periods)}
+    filler = min(periods, key=lambda frameid: (periods[frameid], order[frameid]))
+    for frametime in candidates:
+        slots = place(periods, order, period, frametime)
+        if slots is None:
+            continue
+        # trailing free slots are covered by the wait for the rest of the period
+        while slots[-1] is None:
+            slots.pop()
+        sequence = [filler if frameid is None else frameid for frameid in slots]
+        gaps = max_gaps(sequence, period // frametime)
+        if all(gaps[frameid] * frametime <= p for frameid, p in periods.items()):
+            break
+    else:
+        raise USBliniError("ERROR: frame periods can't be scheduled with a slot time of at least {} ms".format(slottime))
+
+    busy = sum(frame_time(lengths.get(frameid, DEFAULT_LENGTH), baudrate, 1.0) for frameid in sequence)
+    return CompiledSchedule(period, frametime, sequence, busy / period)
+
+def compile_ldf_schedule(ldf, table, baudrate = None, frametime = None):
+    """
+    Compile schedule table of a LIN description file. If all entries are frames with the
+    same delay, the table is used as sequence as it is. Otherwise each frame gets the
+    period of the table divided by its number of entries. Master commands are not sent,
+    but their delays count for the period.
+    :param ldf: LIN description file
+    :type ldf: LDF
+    :param table: Name of schedule table
+    :type table: string
+    :param baudrate: Baudrate in Hz (default: speed of the LDF)
+    :type baudrate: integer
+    :param frametime: Slot time in milliseconds for tables with different delays (default: as long as possible)
+    :type frametime: integer
+    :rtype: CompiledSchedule
+    """
+    if table not in ldf.schedule_tables:
+        raise USBliniError("ERROR: unknown schedule table {}".format(table))
+    entries = ldf.schedule_tables[table]
+    baudrate = baudrate or ldf.speed or DEFAULT_BAUDRATE
+    sequence = []
+    lengths = {}
+    for name, delay in entries:
+        if name is None:
+            continue
+        frame = ldf.frames.get(name)
+        if frame is None:
+            raise USBliniError("ERROR: unknown frame {} in schedule table {}".format(name, table))
+        sequence.append(frame.frameid)
+        lengths[frame.frameid] = frame.length
+    if not sequence:
+        return CompiledSchedule(0, 0, [], 0.0)
+
+    delays = set(delay for name, delay in entries)
+    if len(delays) == 1 and len(sequence) == len(entries) and frametime is None and float(entries[0][1]).is_integer():
+        delay = int(entries[0][1])
+        slottime = int(math.ceil(max(frame_time(length, baudrate) for length in lengths.values())))
+        if delay < slottime:
+            raise USBliniError("ERROR: delay of schedule table {} too short, at least {} ms needed".format(table, slottime))
+        period = delay * len(sequence)
+        if period > MAX_PERIOD:
+            raise USBliniError("ERROR: schedule period of {} ms is too long".format(period))
+        busy = sum(frame_time(lengths[frameid], baudrate, 1.0) for frameid in sequence)
+        return CompiledSchedule(period, delay, sequence, busy / period)
+
+    total = int(round(sum(delay for name, delay in entries)))
+    counts = {}
+    for frameid in sequence:
+        counts[frameid] = counts.get(frameid, 0) + 1
+    periods = {}
+    for frameid, count in counts.items():
+        if total % count:
+            raise USBliniError("ERROR: frame {:#x} is not scheduled with a fixed period".format(frameid))
+        periods[frameid] = total // count
+    return compile_schedule(periods, baudrate, lengths, frametime)
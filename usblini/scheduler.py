@@ -0,0 +1,91 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+# 
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from .metrics import LatencyHistogram
+
+class USBliniScheduler(threading.Thread):
+    """
+    Executes device commands one after the other in a worker thread. Commands with
+    lower priority value are executed first, commands of equal priority in order of
+    submission. A running command is never interrupted.
+    """
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.running = True
+        self.executed = 0
+        self.queue_delay = LatencyHistogram()
+
+    def submit(self, priority, func, args, kwargs):
+        """
+        Queue command for execution.
+        :param priority: Priority (lower value is executed first)
+        :type priority: integer
+        :return: Future for the result of the command. Its attribute queue_delay holds
+            the time in seconds the command waited in the queue once it was started.
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        future.queue_delay = None
+        with self.condition:
+            heapq.heappush(self.queue, (priority, next(self.counter), time.perf_counter(), future, func, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def is_current(self):
+        return threading.current_thread() is self
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and self.running:
+                    self.condition.wait()
+                if not self.queue:
+                    return
+                priority, _, submitted, future, func, args, kwargs = heapq.heappop(self.queue)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            future.queue_delay = time.perf_counter() - submitted
+            self.queue_delay.add(future.queue_delay)
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            self.executed += 1
+
+    def stop(self):
+        """
+        Stop worker thread after executing all queued commands.
+        """
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def snapshot(self):
+        return {'queued': len(self.queue), 'executed': self.executed, 'queue_delay': self.queue_delay.snapshot()}
@@ -0,0 +1,104 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import queue
+import threading
+import zipfile
+from .logic import SAMPLERATE
+
+
+def samplerate_text(samplerate):
+    for factor, unit in ((1000000, 'MHz'), (1000, 'kHz')):
+        if samplerate % factor == 0:
+            return '{} {}'.format(samplerate // factor, unit)
+    return '{} Hz'.format(samplerate)
+
+
+class SigrokRecorder(threading.Thread):
+    """
+    Logic listener (LOGIC_MODE_SAMPLES) writing a sigrok session file (.sr) which can be
+    opened with PulseView. Samples are collected into chunks which are compressed and
+    written as members logic-1-1, logic-1-2, ... by a background thread, so memory use
+    is bounded by chunksize * (queuesize + 1) bytes. Samples received after close are
+    ignored.
+    """
+
+    def __init__(self, filename, probename = 'LIN', samplerate = SAMPLERATE, chunksize = 1 << 20, queuesize = 4):
+        """
+        :param filename: Name of the .sr file
+        :type filename: string
+        :param probename: Name of the channel
+        :type probename: string
+        :param samplerate: Samplerate in Hz
+        :type samplerate: integer
+        :param chunksize: Number of samples per chunk
+        :type chunksize: integer
+        :param queuesize: Number of chunks waiting for compression before the listener blocks
+        :type queuesize: integer
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.filename = filename
+        self.probename = probename
+        self.samplerate = samplerate
+        self.chunksize = chunksize
+        self.queue = queue.Queue(queuesize)
+        self.buffer = bytearray()
+        self.samples = 0
+        self.chunks = 0
+        self.lock = threading.Lock()
+        self.closed = False
+        self.zip = zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED)
+        self.zip.writestr('version', '2')
+        self.start()
+
+    def __call__(self, position, samples):
+        with self.lock:
+            if self.closed:
+                return
+            self.buffer += memoryview(samples)
+            while len(self.buffer) >= self.chunksize:
+                self.queue.put(bytes(self.buffer[:self.chunksize]))
+                del self.buffer[:self.chunksize]
+
+    def run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            self.chunks += 1
+            # sample byte: bit0 = probe1
+            self.zip.writestr('logic-1-{}'.format(self.chunks), chunk)
+            self.samples += len(chunk)
+        self.zip.writestr('metadata',
+                          '[device 1]\ncapturefile=logic-1\ntotal probes=1\nsamplerate={}\n'
+                          'total analog=0\nprobe1={}\nunitsize=1\n'.format(samplerate_text(self.samplerate), self.probename))
+        self.zip.close()
+
+    def close(self):
+        """
+        Write the remaining samples and finish the file. Remove the listener before.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if self.buffer:
+                self.queue.put(bytes(self.buffer))
+                self.buffer = bytearray()
+            self.queue.put(None)
+        self.join()
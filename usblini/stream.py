@@ -0,0 +1,141 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+import collections
+import threading
+from .usblini import USBlini
+
+
+class AsyncStream(object):
+    """
+    Bounded buffer between a listener (called in the USB event or dispatcher thread)
+    and an asyncio consumer. The loop is woken up at most once until the consumer has
+    taken the buffered items, so a burst of frames costs one thread hop.
+    Use "async for item in stream" for single items or "async for batch in stream.batches()".
+    """
+
+    def __init__(self, loop, maxsize, overflow, remove = None):
+        """
+        :param loop: Event loop of the consumer
+        :param maxsize: Maximal number of buffered items
+        :type maxsize: integer
+        :param overflow: What to do if the buffer is full (USBlini.DISPATCH_OVERFLOW_*).
+                         DISPATCH_OVERFLOW_BLOCK blocks the calling thread, use it together with the dispatcher.
+        :type overflow: integer
+        :param remove: Called once when the stream is closed (unregisters the listener)
+        :type remove: function
+        """
+        self.loop = loop
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.remove = remove
+        self.items = collections.deque()
+        self.batch = collections.deque()
+        self.condition = threading.Condition()
+        self.wakeup_pending = False
+        self.waiter = None
+        self.closed = False
+        self.dropped = 0
+        self.wakeups = 0
+
+    def __call__(self, item):
+        with self.condition:
+            if self.closed:
+                return
+            if len(self.items) >= self.maxsize:
+                if self.overflow == USBlini.DISPATCH_OVERFLOW_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif self.overflow == USBlini.DISPATCH_OVERFLOW_DROP_OLDEST:
+                    self.items.popleft()
+                    self.dropped += 1
+                else:
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+            self.items.append(item)
+            if not self.wakeup_pending:
+                self.wakeup_pending = True
+                self.wakeups += 1
+                self.loop.call_soon_threadsafe(self.wakeup)
+
+    def wakeup(self):
+        with self.condition:
+            self.wakeup_pending = False
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def get_batch(self):
+        """
+        Wait for items and take all buffered items.
+        :return: Buffered items, empty list if the stream is closed
+        :rtype: list
+        """
+        while True:
+            with self.condition:
+                if self.items:
+                    batch = list(self.items)
+                    self.items.clear()
+                    self.condition.notify_all()
+                    return batch
+                if self.closed:
+                    return []
+            self.waiter = self.loop.create_future()
+            try:
+                await self.waiter
+            finally:
+                self.waiter = None
+
+    async def batches(self):
+        """
+        Asynchronous generator of item batches.
+        """
+        while True:
+            batch = await self.get_batch()
+            if not batch:
+                return
+            yield batch
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.batch:
+            self.batch.extend(await self.get_batch())
+            if not self.batch:
+                raise StopAsyncIteration
+        return self.batch.popleft()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """
+        Unregister the listener and end the iteration after the buffered items.
+        """
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        if self.remove is not None:
+            self.remove()
+        self.loop.call_soon_threadsafe(self.wakeup)
@@ -0,0 +1,102 @@
+# This file is part of the pyUSBlini project.
+#
+# Copyright(c) 2021-2024 Thomas Fischl (https://www.fischl.de)
+#
+# pyUSBlini is free software: you can redistribute it and/or modify
+# it under the terms of the GNU LESSER GENERAL PUBLIC LICENSE as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyUSBlini is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU LESSER GENERAL PUBLIC LICENSE for more details.
+#
+# You should have received a copy of the GNU LESSER GENERAL PUBLIC LICENSE
+# along with pyUSBlini.  If not, see <http://www.gnu.org/licenses/>
+
+
+class FrameSubscription(object):
+    """
+    Frame listener which only calls its callback if a frame changed. Without decoder
+    the payload bytes are compared with the last received payload of the same frame
+    identifier. With decoder the decoded signal values are compared with the last
+    reported values; numeric signals only count as changed if they moved further
+    than the deadband.
+    """
+
+    def __init__(self, callback, frameids, decoder = None, signals = None, deadband = 0):
+        """
+        :param callback: Called with (frame) without decoder, (frame, changed signal values) with decoder
+        :type callback: function
+        :param frameids: LIN frame identifier(s) the subscription is registered for (None: all frames)
+        :type frameids: integer or list(int)
+        :param decoder: Object with decode(frame) method returning a dictionary of signal values (e.g. LDF)
+        :param signals: Only watch these signals (None: all signals of the frame)
+        :type signals: list(string)
+        :param deadband: Minimal change of numeric signals, either one value or a dictionary per signal
+        :type deadband: float or dict
+        """
+        self.callback = callback
+        self.frameids = frameids
+        self.decoder = decoder
+        self.signals = None if signals is None else set(signals)
+        self.deadband = deadband
+        # last payload per frame identifier
+        self.payloads = [None] * 64
+        # last reported signal values per frame identifier
+        self.values = [{} for _ in range(64)]
+        self.received = 0
+        self.suppressed = 0
+
+    def __call__(self, frame):
+        self.received += 1
+        data = bytes(frame.data)
+        if data == self.payloads[frame.frameid]:
+            self.suppressed += 1
+            return
+        self.payloads[frame.frameid] = data
+        if self.decoder is None:
+            self.callback(frame)
+            return
+        values = self.decoder.decode(frame)
+        changed = self.changed_values(self.values[frame.frameid], values) if values else None
+        if not changed:
+            self.suppressed += 1
+            return
+        self.callback(frame, changed)
+
+    def changed_values(self, last, values):
+        """
+        Compare decoded values with the last reported ones and remember the changed ones.
+        :return: Dictionary of changed signal values
+        :rtype: dict
+        """
+        changed = {}
+        for name, value in values.items():
+            if self.signals is not None and name not in self.signals:
+                continue
+            previous = last.get(name)
+            if previous is not None and self.within_deadband(name, previous, value):
+                continue
+            last[name] = value
+            changed[name] = value
+        return changed
+
+    def within_deadband(self, name, previous, value):
+        if value == previous:
+            return True
+        if isinstance(value, (str, bytes)) or isinstance(previous, (str, bytes)):
+            return False
+        if isinstance(self.deadband, dict):
+            deadband = self.deadband.get(name, 0)
+        else:
+            deadband = self.deadband
+        return abs(value - previous) <= deadband
+
+    def reset(self):
+        """
+        Forget cached payloads and values, the next frame of each identifier is reported again.
+        """
+        self.payloads = [None] * 64
+        self.values = [{} for _ in range(64)]
@@ -17,6 +17,84 @@
 
 import usb1
 import threading
+import collections
+import asyncio
+import struct
+import time
+import functools
+import math
+import traceback
+from .metrics import USBliniMetrics
+from .metrics import LatencyHistogram
+from .clock import DeviceClock
+from .scheduler import USBliniScheduler
+from concurrent.futures import Future
+from . import checksum
+from .checksum import checksum_model
+
+# EP1 report layout: type/source, PID (error flags), length, data + checksum, timestamp, autobaud value
+REPORT_SIZE = 16
+REPORT_STRUCT = struct.Struct('<BBB9sHH')
+
+def iter_reports(buffer, length = None):
+    """
+    Iterate over the reports contained in an EP1 transfer buffer without copying it.
+    Yields tuples (header, pid, length, payload, timestamp, autobaudvalue).
+    :param buffer: Transfer buffer (any object supporting the buffer protocol)
+    :param length: Number of valid bytes in buffer
+    :type length: integer
+    """
+    if length is None:
+        length = len(buffer)
+    return REPORT_STRUCT.iter_unpack(memoryview(buffer)[:length - length % REPORT_SIZE])
+
+def parse_reports(buffer, length = None):
+    """
+    Decode all frame and status reports of an EP1 transfer buffer at once.
+    :param buffer: Transfer buffer (any object supporting the buffer protocol)
+    :param length: Number of valid bytes in buffer
+    :type length: integer
+    :rtype: list(LINFrame or StatusReport)
+    """
+    reports = []
+    for fields in iter_reports(buffer, length):
+        reporttype = fields[0] & USBlini.MASK_REPORT_TYPE
+        if reporttype == USBlini.REPORT_TYPE_FRAME:
+            reports.append(LINFrame.from_fields(*fields[1:]))
+        elif reporttype == USBlini.REPORT_TYPE_STATUS:
+            reports.append(StatusReport.from_fields(*fields[1:]))
+    return reports
+
+# default of timeout parameters (None means wait forever)
+DEFAULT_TIMEOUT = object()
+
+# marks threads which are delivering USB data to listeners (USB event thread, dispatcher)
+listener_thread = threading.local()
+
+def in_listener_thread():
+    return getattr(listener_thread, 'active', False)
+
+def device_command(method):
+    """
+    Decorator for methods sending commands to the device. If the command scheduler is
+    running, the call is executed by the scheduler (normal priority), otherwise it is
+    serialized with a lock.
+    Commands can't be called from listeners: the thread delivering the listener
+    callbacks must not block, it also delivers the responses. Use submit() there.
+    """
+    @functools.wraps(method)
+    def command(self, *args, **kwargs):
+        scheduler = self.scheduler
+        if scheduler is not None and scheduler.is_current():
+            with self.command_lock:
+                return method(self, *args, **kwargs)
+        if in_listener_thread():
+            raise USBliniError("ERROR: device commands can't be called in listeners, use submit()")
+        if scheduler is None:
+            with self.command_lock:
+                return method(self, *args, **kwargs)
+        return scheduler.submit(self.PRIORITY_NORMAL, method, (self,) + args, kwargs).result()
+    return command
 
 class USBlini(object):
 
@@ -49,58 +127,188 @@ class USBlini(object):
     CMD_SLAVE_SET_RELOADVALUE = 0x22
     CMD_SLAVE_SET_RESETMASK =   0x23
 
-    def __init__(self):
-        """ Initialze """
+    DISPATCH_OVERFLOW_DROP_NEWEST = 0
+    DISPATCH_OVERFLOW_DROP_OLDEST = 1
+    DISPATCH_OVERFLOW_BLOCK =       2
+
+    LOGIC_MODE_RAW =     0
+    LOGIC_MODE_SAMPLES = 1
+    LOGIC_MODE_EDGES =   2
+
+    PRIORITY_HIGH =   0
+    PRIORITY_NORMAL = 10
+    PRIORITY_LOW =    20
+
+    def __init__(self, context = None):
+        """
+        Initialze
+        :param context: Shared libusb context (see USBliniManager). If not given, an own
+            context and USB event thread are used.
+        :type context: usb1.USBContext
+        """
        
         self.frame_listeners = []
+        self.frame_id_listeners = [[] for _ in range(64)]
+        self.frame_listener_table = [()] * 64
         self.statusreport_listeners = []
+        # only deliver status reports which differ from the previous one
+        self.statusreport_changes_only = True
+        self.statusreport_last = None
+        self.statusreport_suppressed = 0
         self.logic_listeners = []
-        self.ctx = usb1.USBContext()
+        self.pending_writes = collections.deque()
+        self.pending_lock = threading.Lock()
+        self.master_write_timeout = 1.0
+        self.master_write_retries = 0
+        self.master_write_stale = 5.0
+        self.master_write_latency = [LatencyHistogram() for _ in range(64)]
+        self.dispatcher = None
+        self.scheduler = None
+        self.command_lock = threading.RLock()
+        self.metrics = None
+        self.clock = DeviceClock()
+        self.master_sequence = None
+        self.slave_table_forget()
+        self.usbhandle = None
+        self.connected = False
+        self.reconnects = 0
+        self.hotplug_handle = None
+        self.baudrate = None
+        self.ep2in_transfer = []
+        self.eventthread = None
+        self.ctx_owned = context is None
+        self.ctx = usb1.USBContext() if context is None else context
 
-    def open(self, serialnumber = None):
+    def open(self, serialnumber = None, ep1_transfers = 4, ep1_size = 64, ep2_transfers = 4, ep2_size = 25*64, ep2_lazy = False, device = None,
+             reconnect = False):
         """
         Open connection to USBlini.
         :param serialnumber: USB serial number
         :type serialnumber: string
+        :param ep1_transfers: Number of interrupt transfers kept in flight for frame/status reports
+        :type ep1_transfers: integer
+        :param ep1_size: Buffer size of one EP1 transfer in bytes (multiple of 64)
+        :type ep1_size: integer
+        :param ep2_transfers: Number of interrupt transfers kept in flight for logic analyzer data (0: disable)
+        :type ep2_transfers: integer
+        :param ep2_size: Buffer size of one EP2 transfer in bytes (multiple of 64)
+        :type ep2_size: integer
+        :param ep2_lazy: Don't submit EP2 transfers before the first logic listener is added
+        :type ep2_lazy: bool
+        :param device: Already enumerated USB device to open (skips enumeration)
+        :type device: usb1.USBDevice
+        :param reconnect: Watch for disconnects (libusb hotplug), reopen the adapter with the same serial
+            number when it returns and restore baudrate, slave table and master sequence
+        :type reconnect: bool
         """
 
-        self.ctx.open()
+        if self.ctx_owned:
+            self.ctx.open()
 
-        self.usbdev = self.get_usb_device(serialnumber)
+        self.usbdev = device if device is not None else self.get_usb_device(serialnumber)
         if self.usbdev is None:
             raise USBliniNotFoundError("USBlini not found. Please check connection - no charge-only USB cable?")
 
+        self.serialnumber = serialnumber
+        if serialnumber is None:
+            try:
+                self.serialnumber = self.usbdev.getSerialNumber()
+            except usb1.USBErrorAccess:
+                pass
+
+        self.slave_table_forget()
+        self.ep1_stats = USBliniTransferStats(0x81, ep1_transfers, ep1_size)
+        self.ep2_stats = USBliniTransferStats(0x82, ep2_transfers, ep2_size)
+        self.ep2_lazy = ep2_lazy
+        self.device_open()
+
+        self.hotplug_handle = None
+        if reconnect:
+            if not usb1.hasCapability(usb1.CAP_HAS_HOTPLUG):
+                raise USBliniError("ERROR: libusb has no hotplug support on this platform")
+            self.reconnectthread = USBliniReconnectHandler(self)
+            self.reconnectthread.start()
+            self.hotplug_handle = self.ctx.hotplugRegisterCallback(self.hotplug_callback, flags=0,
+                                                                   vendor_id=self.USB_VID, product_id=self.USB_PID)
+
+        if self.ctx_owned:
+            self.eventthread = USBliniUSBEventHandler(self.ctx)
+            self.eventthread.start()
+
+    def device_open(self):
+        """
+        Open USB device handle and submit the interrupt IN transfers.
+        """
         self.usbhandle = self.usbdev.open()
         self.usbhandle.claimInterface(0)        
 
-        self.receiveevent = threading.Event()
+        self.clock = DeviceClock()
+        self.statusreport_last = None
+        # transfers of a previous handle stay counted as pending until they failed
+        self.ep1in_transfer = self.transfers_submit(self.ep1_stats, self.usbtransfer_ep1_callback)
+        self.ep2in_transfer = []
+        if not self.ep2_lazy or self.logic_listeners:
+            self.ep2in_transfer = self.transfers_submit(self.ep2_stats, self.usbtransfer_ep2_callback)
+        self.connected = True
 
-        th1 = usb1.USBTransferHelper()
-        th1.setEventCallback(usb1.TRANSFER_COMPLETED, self.usbtransfer_ep1_callback)
-        self.ep1in_transfer = []
-        for _ in range(4):
-            t = self.usbhandle.getTransfer()
-            t.setInterrupt(0x81, 64, th1)
-            t.submit()
-            self.ep1in_transfer.append(t)
+    def hotplug_callback(self, ctx, device, event):
+        """
+        Called from USB event thread on hotplug events. No synchronous USB calls are
+        allowed here, so reconnecting is left to the reconnect thread.
+        """
+        if event == usb1.HOTPLUG_EVENT_DEVICE_LEFT:
+            if self.connected and device.getBusNumber() == self.usbdev.getBusNumber() and \
+                    device.getDeviceAddress() == self.usbdev.getDeviceAddress():
+                self.connected = False
+                self.master_write_fail_all(USBliniError("Error while master write. USBlini disconnected"))
+        elif not self.connected:
+            self.reconnectthread.trigger()
+        return False
 
-        th2 = usb1.USBTransferHelper()
-        th2.setEventCallback(usb1.TRANSFER_COMPLETED, self.usbtransfer_ep2_callback)
-        self.ep2in_transfer = []
-        for _ in range(4):
-            t = self.usbhandle.getTransfer()
-            t.setInterrupt(0x82, 25*64, th2)
-            t.submit()
-            self.ep2in_transfer.append(t)
+    @device_command
+    def reconnect(self):
+        """
+        Try to reopen the adapter with the same serial number and restore the last
+        configured baudrate, slave table and master sequence.
+        :return: True if the adapter was reopened
+        :rtype: bool
+        """
+        device = self.get_usb_device(self.serialnumber)
+        if device is None:
+            return False
+        try:
+            self.usbhandle.close()
+        except usb1.USBError:
+            pass
+        self.usbdev = device
+        self.device_open()
+        self.reconnects += 1
 
-        self.eventthread = USBliniUSBEventHandler(self)
-        self.eventthread.start()
+        if self.baudrate is not None:
+            self.set_baudrate(*self.baudrate)
+        for tableid in range(16):
+            if self.slave_frames[tableid] is not None:
+                value, data = self.slave_frames[tableid]
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_FRAME, value, tableid, data)
+            if self.slave_reloadvalues[tableid] is not None:
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RELOADVALUE, self.slave_reloadvalues[tableid], tableid, [])
+            if self.slave_resetmasks[tableid] is not None:
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RESETMASK, self.slave_resetmasks[tableid], tableid, [])
+        if self.master_sequence is not None:
+            self.master_set_sequence(*self.master_sequence)
+        return True
 
     def close(self):
         """
         Close connection to USBlini.
         """
 
+        if self.hotplug_handle is not None:
+            self.ctx.hotplugDeregisterCallback(self.hotplug_handle)
+            self.hotplug_handle = None
+            self.reconnectthread.stop()
+            self.reconnectthread.join()
+
         for transfer in self.ep1in_transfer:
             try:
                 transfer.cancel()
@@ -113,10 +321,40 @@ class USBlini(object):
             except usb1.USBErrorNotFound:
                 pass
 
-        self.eventthread.stop()
-        self.eventthread.join()
+        self.scheduler_stop()
+        self.dispatcher_stop()
+        if self.ctx_owned:
+            self.eventthread.stop()
+            self.eventthread.join()
         self.usbdev.close()
-        self.ctx.close()
+        if self.ctx_owned:
+            self.ctx.close()
+
+    def transfers_submit(self, stats, callback):
+        """
+        Create and submit interrupt IN transfers.
+        :rtype: list(USBTransfer)
+        """
+        helper = usb1.USBTransferHelper()
+        helper.setEventCallback(usb1.TRANSFER_COMPLETED, callback)
+        helper.setDefaultCallback(stats.transfer_failed)
+        transfers = []
+        for _ in range(stats.depth):
+            t = self.usbhandle.getTransfer()
+            t.setInterrupt(stats.endpoint, stats.size, helper)
+            t.submit()
+            stats.pending += 1
+            transfers.append(t)
+        return transfers
+
+    def get_transfer_stats(self):
+        """
+        Get statistics of the interrupt IN transfers. "starved" counts how often a transfer
+        completed while no other transfer of this endpoint was pending, i.e. how often the
+        endpoint was not served by the host.
+        :rtype: dict
+        """
+        return {'ep1': self.ep1_stats.snapshot(), 'ep2': self.ep2_stats.snapshot()}
 
     def get_usb_device(self, serialnumber = None):
         """
@@ -138,38 +376,248 @@ class USBlini(object):
                     pass
 
     def usbtransfer_ep1_callback(self, t):
-        data = t.getBuffer()[:t.getActualLength()]
-        for i in range(0, len(data), 16):
-            report = data[i:i+16]
-            if report[0] & self.MASK_REPORT_SOURCE == self.REPORT_SOURCE_USER:
-                self.response = report
-                self.receiveevent.set()
-            if report[0] & self.MASK_REPORT_TYPE == self.REPORT_TYPE_FRAME:
-                f = LINFrame.from_report(report)
-                for listener in self.frame_listeners:
-                    listener(f)
-            if report[0] & self.MASK_REPORT_TYPE == self.REPORT_TYPE_STATUS:
-                f = StatusReport.from_report(report)
-                for listener in self.statusreport_listeners:
-                    listener(f)
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        stats = self.ep1_stats
+        stats.transfer_completed()
+        # read once, dispatcher_stop may run concurrently
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            listener_thread.active = True
+            try:
+                self.process_ep1(t.getBuffer(), t.getActualLength(), time.monotonic())
+            finally:
+                listener_thread.active = False
+        else:
+            dispatcher.put(1, t.getBuffer(), t.getActualLength(), time.monotonic())
+        stats.pending += 1
+        if metrics is not None:
+            metrics.ep1_callback.add(time.perf_counter() - start)
         return True
 
     def usbtransfer_ep2_callback(self, t):
-        data = t.getBuffer()[:t.getActualLength()]
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        stats = self.ep2_stats
+        stats.transfer_completed()
+        # read once, dispatcher_stop may run concurrently
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            listener_thread.active = True
+            try:
+                self.process_ep2(t.getBuffer()[:t.getActualLength()])
+            finally:
+                listener_thread.active = False
+        else:
+            dispatcher.put(2, t.getBuffer(), t.getActualLength(), time.monotonic())
+        stats.pending += 1
+        if metrics is not None:
+            metrics.ep2_callback.add(time.perf_counter() - start)
+        return True
+
+    def process_ep1(self, buffer, length, hosttime):
+        """
+        Decode EP1 reports and call frame and status report listeners.
+        :param hosttime: Host time of transfer completion in seconds (time.monotonic() clock)
+        :type hosttime: float
+        """
+        metrics = self.metrics
+        clock = self.clock
+        offset = 0
+        # device time is unwrapped and correlated with the monotonic clock, so steps of the
+        # wall clock don't affect it; host_time follows the wall clock
+        walloffset = time.time() - time.monotonic()
+        for header, pid, size, payload, timestamp, autobaudvalue in iter_reports(buffer, length):
+            if metrics is not None:
+                metrics.reports[header] += 1
+            if header & self.MASK_REPORT_SOURCE == self.REPORT_SOURCE_USER:
+                self.master_write_complete(bytes(buffer[offset:offset + REPORT_SIZE]))
+            offset += REPORT_SIZE
+            reporttype = header & self.MASK_REPORT_TYPE
+            if reporttype == self.REPORT_TYPE_FRAME:
+                devicetime = clock.unwrap(timestamp, hosttime)
+                clock.update(devicetime, hosttime)
+                listeners = self.frame_listener_table[pid & 0x3f]
+                if listeners:
+                    f = LINFrame.from_fields(pid, size, payload, timestamp, autobaudvalue)
+                    f.device_time = devicetime
+                    f.host_time = clock.to_host(devicetime) + walloffset
+                    if metrics is not None:
+                        start = time.perf_counter()
+                    for listener in listeners:
+                        listener(f)
+                    if metrics is not None:
+                        metrics.frame_listeners.add(time.perf_counter() - start)
+            elif reporttype == self.REPORT_TYPE_STATUS:
+                status = (pid, payload[0] << 8 | size)
+                if self.statusreport_changes_only and status == self.statusreport_last:
+                    self.statusreport_suppressed += 1
+                    continue
+                self.statusreport_last = status
+                if self.statusreport_listeners:
+                    f = StatusReport(*status)
+                    if metrics is not None:
+                        start = time.perf_counter()
+                    for listener in self.statusreport_listeners:
+                        listener(f)
+                    if metrics is not None:
+                        metrics.statusreport_listeners.add(time.perf_counter() - start)
+
+    def process_ep2(self, data):
+        """
+        Call logic listeners with sampled data.
+        """
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.logic_bytes += len(data)
+            start = time.perf_counter()
         for listener in self.logic_listeners:
             listener(data)
-        return True
+        if metrics is not None:
+            metrics.logic_listeners.add(time.perf_counter() - start)
+
+    def metrics_enable(self):
+        """
+        Start collecting counters and latency histograms (resets previously collected values).
+        """
+        self.metrics = USBliniMetrics()
+
+    def metrics_disable(self):
+        """
+        Stop collecting counters and latency histograms.
+        """
+        self.metrics = None
+
+    def metrics_snapshot(self):
+        """
+        Get a copy of the collected metrics. Can be called from any thread.
+        :rtype: dict or None if metrics are disabled
+        """
+        metrics = self.metrics
+        if metrics is None:
+            return None
+        snapshot = metrics.snapshot()
+        if self.usbhandle is not None:
+            snapshot['transfers'] = self.get_transfer_stats()
+        snapshot['dispatcher'] = self.get_dispatcher_stats()
+        snapshot['scheduler'] = self.get_scheduler_stats()
+        return snapshot
+
+    def dispatcher_start(self, queuesize = 256, overflow = DISPATCH_OVERFLOW_DROP_NEWEST, batchsize = 16):
+        """
+        Decouple listener execution from the USB event thread. The transfer callbacks
+        only copy the raw data into a preallocated queue, a worker thread decodes it
+        and calls the listeners.
+        :param queuesize: Number of transfer buffers the queue can hold
+        :type queuesize: integer
+        :param overflow: What to do if the queue is full (DISPATCH_OVERFLOW_*)
+        :type overflow: integer
+        :param batchsize: Maximum number of buffers the worker takes from the queue at once
+        :type batchsize: integer
+        """
+        if self.dispatcher is not None:
+            raise USBliniError("ERROR: dispatcher already running")
+        dispatcher = USBliniDispatcher(self, queuesize, max(self.ep1_stats.size, self.ep2_stats.size), overflow, batchsize)
+        dispatcher.start()
+        self.dispatcher = dispatcher
+
+    def get_dispatcher_stats(self):
+        """
+        Get dispatcher queue statistics.
+        :rtype: dict or None if dispatcher is not running
+        """
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return None
+        return {'queued': dispatcher.count,
+                'dropped_reports': dispatcher.dropped_reports,
+                'dropped_logic_bytes': dispatcher.dropped_logic_bytes,
+                'listener_errors': dispatcher.listener_errors}
+
+    def dispatcher_stop(self):
+        """
+        Stop dispatcher thread after delivering all queued data. Listeners are called
+        from the USB event thread again.
+        """
+        dispatcher = self.dispatcher
+        if dispatcher is None:
+            return
+        self.dispatcher = None
+        dispatcher.stop()
+        dispatcher.join()
+
+    def scheduler_start(self):
+        """
+        Start command scheduler. From now on all device commands (also direct method calls
+        from any thread) are executed one after the other by the scheduler thread.
+        """
+        if self.scheduler is not None:
+            raise USBliniError("ERROR: scheduler already running")
+        scheduler = USBliniScheduler()
+        scheduler.start()
+        self.scheduler = scheduler
+
+    def scheduler_stop(self):
+        """
+        Stop command scheduler after executing all queued commands.
+        """
+        scheduler = self.scheduler
+        if scheduler is None:
+            return
+        self.scheduler = None
+        scheduler.stop()
+        scheduler.join()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a device command without blocking. Example:
+        future = usblini.submit(usblini.master_write, 0x10, USBlini.CHECKSUM_MODE_LIN2, [], priority=USBlini.PRIORITY_HIGH)
+        For master_write only the control transfer is queued, the response is awaited
+        outside the scheduler, so it doesn't hold back other commands.
+        :param func: Command (method of this object) to execute
+        :type func: function
+        :param priority: Keyword only. Commands with lower value are executed first (PRIORITY_*)
+        :type priority: integer
+        :return: Future of the command result, queue_delay attribute holds the queueing delay in seconds
+        :rtype: concurrent.futures.Future
+        """
+        priority = kwargs.pop('priority', self.PRIORITY_NORMAL)
+        scheduler = self.scheduler
+        if scheduler is None:
+            raise USBliniError("ERROR: scheduler not running")
+        if getattr(func, '__func__', None) is USBlini.master_write and func.__self__ is self:
+            future = Future()
+            future.queue_delay = None
+            waiter = threading.Thread(target=self.master_write_future, args=(future, priority, args, kwargs))
+            waiter.daemon = True
+            waiter.start()
+            return future
+        return scheduler.submit(priority, func, args, kwargs)
+
+    def get_scheduler_stats(self):
+        """
+        Get number of queued and executed commands and queueing delay histogram.
+        :rtype: dict or None if scheduler is not running
+        """
+        scheduler = self.scheduler
+        if scheduler is None:
+            return None
+        return scheduler.snapshot()
 
     def get_version(self):
         version = '{:04x}'.format(self.usbdev.getbcdDevice())
         return version[:2] + '.' + version[2:]
 
+    @device_command
     def start_bootloader(self):
         """
         Jump to bootloader.
         """
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_START_BOOTLOADER, 0x5237, 0, [])
 
+    @device_command
     def echo_test(self):
         """
         Echo test. Send code to device and check response.
@@ -177,13 +625,17 @@ class USBlini(object):
         response = self.usbhandle.controlRead(usb1.TYPE_CLASS, self.CMD_ECHO, 0x1234, 0, 2)
         return (response[0] == 0x34) and (response[1] == 0x12) 
 
+    @device_command
     def reset(self):
         """
         Reset the device: clear master and slave tables and set default configuration.
         """
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_RESET, 0, 0, [])
+        self.master_sequence = None
+        self.slave_table_forget()
 
 
+    @device_command
     def set_baudrate(self, baudrate, autobaud = False):
         """
         Set baudrate.
@@ -193,7 +645,9 @@ class USBlini(object):
         :type autobaud: bool
         """
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SET_BAUDRATE, baudrate, int(autobaud), [])
+        self.baudrate = (baudrate, autobaud)
 
+    @device_command
     def slave_set_frame(self, tableid, frameid, checksummode, data, reloadvalue = 0, resetmask = 0):
         """
         Set frame in slave table.
@@ -211,30 +665,305 @@ class USBlini(object):
         :type resetmask: integer
         """
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_FRAME, frameid | checksummode, tableid, data)
+        self.slave_frames[tableid] = (frameid | checksummode, bytes(bytearray(data)))
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RELOADVALUE, reloadvalue, tableid, [])
+        self.slave_reloadvalues[tableid] = reloadvalue
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RESETMASK, resetmask, tableid, [])
+        self.slave_resetmasks[tableid] = resetmask
 
-    def master_write(self, frameid, checksummode, data):
+    @device_command
+    def slave_set_table(self, table):
         """
-        Master write. Blocks until response.
-        :type tableid: integer
+        Set several slots of the slave table. Only fields which differ from the last
+        state written to the device (frame/data, reload value, reset mask) are transmitted.
+        :param table: Slot contents given as (frameid, checksummode, data, reloadvalue, resetmask)
+            tuples, either as list indexed by table identifier or as dict. Reload value and reset
+            mask may be omitted (default 0), None entries are left unchanged.
+        :type table: list(tuple) or dict(int, tuple)
+        :return: Number of control transfers sent
+        :rtype: integer
+        """
+        if not isinstance(table, dict):
+            table = dict(enumerate(table))
+        transfers = 0
+        for tableid, entry in sorted(table.items()):
+            if entry is None:
+                continue
+            if not 0 <= tableid < 16:
+                raise USBliniError("ERROR: invalid slave table identifier")
+            frameid, checksummode, data = entry[:3]
+            reloadvalue = entry[3] if len(entry) > 3 else 0
+            resetmask = entry[4] if len(entry) > 4 else 0
+            frame = (frameid | checksummode, bytes(bytearray(data)))
+            if self.slave_frames[tableid] != frame:
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_FRAME, frame[0], tableid, data)
+                self.slave_frames[tableid] = frame
+                transfers += 1
+            if self.slave_reloadvalues[tableid] != reloadvalue:
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RELOADVALUE, reloadvalue, tableid, [])
+                self.slave_reloadvalues[tableid] = reloadvalue
+                transfers += 1
+            if self.slave_resetmasks[tableid] != resetmask:
+                self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_SLAVE_SET_RESETMASK, resetmask, tableid, [])
+                self.slave_resetmasks[tableid] = resetmask
+                transfers += 1
+        return transfers
+
+    def slave_table_forget(self):
+        """
+        Mark host side copy of the slave table as unknown, so the next slave_set_table()
+        transmits all given fields.
+        """
+        self.slave_frames = [None] * 16
+        self.slave_reloadvalues = [None] * 16
+        self.slave_resetmasks = [None] * 16
+
+    def master_write(self, frameid, checksummode, data, timeout = DEFAULT_TIMEOUT, retries = None):
+        """
+        Master write. Blocks until response. The response is checked for matching PID
+        and (if a checksum mode is given) for a valid checksum. Only the control transfer
+        is serialized with the other device commands, waiting for the response doesn't
+        block them. Can't be used in listeners (use master_write_async there).
         :param frameid: LIN frame identifier
         :type frameid: integer
         :param checksummode: Checksum mode (none/LIN1/LIN2)
         :type checksummode: integer
         :param data: Frame data
         :type data: list(int)
+        :param timeout: Maximum time to wait for the response of one attempt in seconds
+            (default: master_write_timeout, None: wait forever)
+        :type timeout: float
+        :param retries: Number of retries after timeout, error or invalid response (default: master_write_retries)
+        :type retries: integer
+        """
+        return self.master_write_wait(frameid, checksummode, data, timeout, retries)
+
+    def master_write_future(self, future, priority, args, kwargs):
+        """
+        Run master write queued by submit() and hand the result over to its future.
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = self.master_write_wait(*args, priority=priority, future=future, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def master_write_wait(self, frameid, checksummode, data, timeout = DEFAULT_TIMEOUT, retries = None,
+                          priority = PRIORITY_NORMAL, future = None):
+        """
+        Master write attempts. Only the control transfers are queued to the scheduler
+        (with given priority), the responses are awaited in the calling thread.
+        """
+        if in_listener_thread():
+            raise USBliniError("ERROR: master_write can't wait for the response in a listener, use master_write_async")
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.master_write_timeout
+        if retries is None:
+            retries = self.master_write_retries
+        attempt = 0
+        while True:
+            request = MasterWriteRequest(frameid)
+            scheduler = self.scheduler
+            if scheduler is None or scheduler.is_current():
+                self.master_write_submit(request, frameid | checksummode, data)
+            else:
+                submitted = scheduler.submit(priority, self.master_write_submit, (request, frameid | checksummode, data), {})
+                submitted.result()
+                if future is not None and future.queue_delay is None:
+                    future.queue_delay = submitted.queue_delay
+            try:
+                if not request.event.wait(timeout):
+                    request.abandoned = True
+                    raise USBliniTimeoutError("Error while master write. No response within {} s".format(timeout))
+                if request.exception is not None:
+                    raise request.exception
+                return self.master_write_result(request, checksummode)
+            except USBliniError:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+
+    @device_command
+    def master_write_submit(self, request, value, data):
+        """
+        Queue request and send the master write control transfer.
         """
-        self.receiveevent.clear()
-        self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_MASTER_WRITE, frameid | checksummode, 0, data)
-        self.receiveevent.wait()
-        # TODO: check report id, check pid, check checksum
+        self.master_write_queue(request)
+        try:
+            self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_MASTER_WRITE, value, 0, data)
+        except:
+            self.master_write_discard(request)
+            raise
 
-        if self.response[0] & self.MASK_REPORT_TYPE == self.REPORT_TYPE_ERROR:
+    def master_write_async_submit(self, request):
+        """
+        Queue request and submit its asynchronous control transfer.
+        """
+        with self.command_lock:
+            self.master_write_queue(request)
+            try:
+                request.transfer.submit()
+            except:
+                self.master_write_discard(request)
+                raise
+
+    async def master_write_async(self, frameid, checksummode, data, timeout = DEFAULT_TIMEOUT, retries = None):
+        """
+        Master write as asyncio coroutine. The control transfer is submitted
+        asynchronously, so several writes can be in flight at the same time.
+        Responses are matched back to their request by PID. If the command scheduler
+        is running, the transfer is submitted by the scheduler like other commands.
+        :param frameid: LIN frame identifier
+        :type frameid: integer
+        :param checksummode: Checksum mode (none/LIN1/LIN2)
+        :type checksummode: integer
+        :param data: Frame data
+        :type data: list(int)
+        :param timeout: Maximum time to wait for the response of one attempt in seconds
+            (default: master_write_timeout, None: wait forever)
+        :type timeout: float
+        :param retries: Number of retries after timeout, error or invalid response (default: master_write_retries)
+        :type retries: integer
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.master_write_timeout
+        if retries is None:
+            retries = self.master_write_retries
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            request = MasterWriteRequest(frameid, loop)
+            request.transfer = self.usbhandle.getTransfer()
+            request.transfer.setControl(usb1.TYPE_CLASS | usb1.ENDPOINT_OUT, self.CMD_MASTER_WRITE, frameid | checksummode, 0,
+                                        bytes(bytearray(data)), callback=self.master_write_transfer_callback, user_data=request)
+            try:
+                try:
+                    scheduler = self.scheduler
+                    if scheduler is None:
+                        self.master_write_async_submit(request)
+                    else:
+                        await asyncio.wrap_future(scheduler.submit(self.PRIORITY_NORMAL, self.master_write_async_submit, (request,), {}))
+                    await asyncio.wait_for(request.future, timeout)
+                except asyncio.TimeoutError:
+                    raise USBliniTimeoutError("Error while master write. No response within {} s".format(timeout))
+                finally:
+                    # also on cancellation: the request must not take the response of a later one
+                    if not request.future.done() or request.future.cancelled():
+                        request.abandoned = True
+                return self.master_write_result(request, checksummode)
+            except USBliniError:
+                if attempt >= retries:
+                    raise
+                attempt += 1
+
+    async def master_write_gather(self, writes, return_exceptions = False):
+        """
+        Queue several master writes at once and wait for all responses.
+        :param writes: Master writes given as (frameid, checksummode, data) tuples
+        :type writes: list(tuple)
+        :param return_exceptions: Return exceptions in result list instead of raising the first one
+        :type return_exceptions: bool
+        :rtype: list
+        """
+        return await asyncio.gather(*[self.master_write_async(*w) for w in writes], return_exceptions=return_exceptions)
+
+    def master_write_transfer_callback(self, t):
+        if t.getStatus() != usb1.TRANSFER_COMPLETED:
+            request = t.getUserData()
+            if self.master_write_discard(request):
+                request.fail(USBliniError("Error while master write. USB control transfer failed (status {})".format(t.getStatus())))
+
+    def master_write_complete(self, report):
+        """
+        Hand master write response over to the oldest pending request with matching PID.
+        Requests abandoned after a timeout only get it if no other request is waiting,
+        so a retry isn't starved by its lost predecessor.
+        """
+        frameid = report[1] & 0x3f
+        with self.pending_lock:
+            if not self.pending_writes:
+                return
+            candidates = [request for request in self.pending_writes if request.frameid == frameid] or self.pending_writes
+            for request in candidates:
+                if not request.abandoned:
+                    break
+            else:
+                request = candidates[0]
+            self.pending_writes.remove(request)
+        latency = time.perf_counter() - request.start
+        self.master_write_latency[request.frameid].add(latency)
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.master_write.add(latency)
+        if not request.abandoned:
+            request.complete(report)
+
+    def master_write_fail_all(self, exception):
+        """
+        Let all pending master writes fail with given exception.
+        """
+        with self.pending_lock:
+            requests = list(self.pending_writes)
+            self.pending_writes.clear()
+        for request in requests:
+            request.fail(exception)
+
+    def master_write_discard(self, request):
+        with self.pending_lock:
+            if request in self.pending_writes:
+                self.pending_writes.remove(request)
+                return True
+        return False
+
+    def master_write_queue(self, request):
+        """
+        Append request to the pending master writes. Requests abandoned after a timeout
+        stay queued for a while, so a late response does not get matched to a newer request.
+        """
+        with self.pending_lock:
+            pending = self.pending_writes
+            while pending and pending[0].abandoned and request.start - pending[0].start > self.master_write_stale:
+                pending.popleft()
+            pending.append(request)
+
+    def master_write_result(self, request, checksummode):
+        """
+        Check master write response and return the frame data.
+        """
+        report = request.report
+        if report[0] & self.MASK_REPORT_TYPE == self.REPORT_TYPE_ERROR:
             raise USBliniError("Error while master write. Please check bus connection (Vbat applied, master-pullup active)!")
 
-        return self.response[3:3+self.response[2]]
+        if report[1] & 0x3f != request.frameid:
+            raise USBliniError("Error while master write. Response PID {:02x} does not match frame identifier {:02x}".format(report[1], request.frameid))
+
+        length = report[2]
+        if length > 1 and checksummode != self.CHECKSUM_MODE_NONE:
+            data = report[3:2+length]
+            if checksummode == self.CHECKSUM_MODE_LIN2 and request.frameid < 0x3c:
+                expected = checksum.checksum_enhanced(request.frameid, data)
+            else:
+                expected = checksum.checksum_classic(data)
+            if report[2+length] != expected:
+                raise USBliniChecksumError("Error while master write. Checksum {:02x} invalid, expected {:02x}".format(report[2+length], expected))
+
+        return report[3:3+length]
 
+    def get_master_write_latency(self, frameid = None):
+        """
+        Get round trip latency statistics of master writes (in seconds).
+        :param frameid: LIN frame identifier (None: dict with all identifiers written so far)
+        :type frameid: integer
+        :rtype: dict
+        """
+        if frameid is not None:
+            return self.master_write_latency[frameid].snapshot()
+        return {frameid: h.snapshot() for frameid, h in enumerate(self.master_write_latency) if h.count}
+
+    @device_command
     def clear_errorflags(self, clearmask = 0xff):
         """
         Clear errorflags.
@@ -244,6 +973,7 @@ class USBlini(object):
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_CLEAR_ERRORFLAGS, clearmask, 0, [])
 
 
+    @device_command
     def master_set_sequence(self, period, frametime, sequence):
         """
         Set master sequence.
@@ -255,25 +985,296 @@ class USBlini(object):
         :type sequence: list(int)
         """
         self.usbhandle.controlWrite(usb1.TYPE_CLASS, self.CMD_MASTER_SET_SEQUENCE, period, frametime, sequence)
+        self.master_sequence = (period, frametime, list(sequence))
+
+    @device_command
+    def master_set_schedule(self, periods, lengths = None, frametime = None):
+        """
+        Compile frame periods into a master sequence and set it. The sequence is only
+        transmitted if it differs from the current master sequence.
+        :param periods: Period in milliseconds per LIN frame identifier, or an already compiled schedule
+        :type periods: dict(int, int) or CompiledSchedule
+        :param lengths: Number of data bytes per LIN frame identifier (default: 8)
+        :type lengths: dict(int, int)
+        :param frametime: Slot time in milliseconds (default: as long as possible)
+        :type frametime: integer
+        :rtype: CompiledSchedule
+        """
+        from .schedule import CompiledSchedule, compile_schedule, DEFAULT_BAUDRATE
+        if isinstance(periods, CompiledSchedule):
+            schedule = periods
+        else:
+            baudrate = self.baudrate[0] if self.baudrate is not None else DEFAULT_BAUDRATE
+            schedule = compile_schedule(periods, baudrate, lengths, frametime)
+        if self.master_sequence != schedule.as_tuple():
+            self.master_set_sequence(*schedule.as_tuple())
+        return schedule
 
-    def frame_listener_add(self, func):
+    def scan(self, frameids = range(64), repetitions = 1, frametime = None):
+        """
+        Scan the bus for responding frame identifiers. All identifiers are requested by
+        one master sequence and the responses are collected by a frame listener. The
+        previously set master sequence is restored afterwards.
+        :param frameids: LIN frame identifiers to request
+        :type frameids: list(int)
+        :param repetitions: Number of times each identifier is requested (for flaky nodes)
+        :type repetitions: integer
+        :param frametime: Time of one frame slot in milliseconds (default: slot time of an 8 byte frame at the configured baudrate)
+        :type frametime: integer
+        :rtype: dict(int, ScanResult) of responding frame identifiers
+        """
+        from .schedule import frame_time, DEFAULT_BAUDRATE
+        if frametime is None:
+            baudrate = self.baudrate[0] if self.baudrate is not None else DEFAULT_BAUDRATE
+            frametime = int(math.ceil(frame_time(8, baudrate)))
+        frameids = list(frameids)
+        results = {}
+
+        def scan_listener(frame):
+            if len(frame.data) > 0:
+                if frame.frameid not in results:
+                    results[frame.frameid] = ScanResult(frame.frameid, repetitions)
+                results[frame.frameid].add(frame)
+
+        previous = self.master_sequence
+        period = frametime * len(frameids)
+        self.frame_listener_add(scan_listener, frameids)
+        try:
+            self.master_set_sequence(period, frametime, frameids)
+            # wait for the last slot and the report to arrive
+            time.sleep((period * repetitions + 2 * frametime) / 1000.0 + 0.05)
+        finally:
+            if previous is None:
+                self.master_set_sequence(0, 0, [])
+            else:
+                self.master_set_sequence(*previous)
+            self.frame_listener_remove(scan_listener, frameids)
+        return results
+
+    def frame_listener_add(self, func, frameids = None):
         """
         Add a frame listener (callback)
         :param func: Function to add to listener list
         :type func: function
+        :param frameids: Only call listener for this LIN frame identifier or set of identifiers (None: all frames)
+        :type frameids: integer or list(int)
         """
-        self.frame_listeners.append(func)
+        if frameids is None:
+            self.frame_listeners.append(func)
+        else:
+            for frameid in self.frameid_list(frameids):
+                self.frame_id_listeners[frameid].append(func)
+        self.frame_listener_table_update()
 
-    def frame_listener_remove(self, func):
+    def frame_listener_remove(self, func, frameids = None):
         """
         Remove given function from listeners list
         :param func: Function to remove from listener list
         :type func: function
+        :param frameids: LIN frame identifier(s) the listener was added for (None: all frames)
+        :type frameids: integer or list(int)
         """
-        if func in self.frame_listeners:
-            self.frame_listeners.remove(func)
+        if frameids is None:
+            listeners = [self.frame_listeners]
         else:
+            listeners = [self.frame_id_listeners[frameid] for frameid in self.frameid_list(frameids)]
+        if not all(func in l for l in listeners):
             raise USBliniError("ERROR: failed to remove frame listener")
+        for l in listeners:
+            l.remove(func)
+        self.frame_listener_table_update()
+
+    def capture_start(self, size, frameids = None):
+        """
+        Start capturing received frames into a preallocated ring buffer (requires NumPy).
+        :param size: Number of frames the ring buffer can hold
+        :type size: integer
+        :param frameids: Only capture this LIN frame identifier or set of identifiers (None: all frames)
+        :type frameids: integer or list(int)
+        :rtype: FrameCapture
+        """
+        from .capture import FrameCapture
+        capture = FrameCapture(size, frameids)
+        self.frame_listener_add(capture, frameids)
+        return capture
+
+    def capture_stop(self, capture):
+        """
+        Stop capturing frames. The captured data stays available in the capture object.
+        :param capture: Capture returned by capture_start
+        :type capture: FrameCapture
+        """
+        self.frame_listener_remove(capture, capture.frameids)
+
+    def capture_file_start(self, filename, frameids = None, blockrecords = 4096):
+        """
+        Start writing received frames into a binary capture file (see CaptureReader).
+        :param filename: Name of the capture file (overwritten)
+        :type filename: string
+        :param frameids: Only write this LIN frame identifier or set of identifiers (None: all frames)
+        :type frameids: integer or list(int)
+        :param blockrecords: Number of records per indexed block
+        :type blockrecords: integer
+        :rtype: CaptureWriter
+        """
+        from .capturefile import CaptureWriter
+        writer = CaptureWriter(filename, blockrecords, frameids)
+        self.frame_listener_add(writer, frameids)
+        return writer
+
+    def capture_file_stop(self, writer):
+        """
+        Stop writing frames and close the capture file.
+        :param writer: Writer returned by capture_file_start
+        :type writer: CaptureWriter
+        """
+        self.frame_listener_remove(writer, writer.frameids)
+        writer.close()
+
+    def subscribe(self, callback, frameids = None, decoder = None, signals = None, deadband = 0):
+        """
+        Subscribe to changes of received frames. The callback is only called if the payload
+        (or, with decoder, one of the decoded signal values) differs from the last frame
+        with the same identifier.
+        :param callback: Called with (frame) without decoder, (frame, changed signal values) with decoder
+        :type callback: function
+        :param frameids: Only watch this LIN frame identifier or set of identifiers (None: all frames)
+        :type frameids: integer or list(int)
+        :param decoder: Object with decode(frame) method returning a dictionary of signal values (e.g. LDF)
+        :param signals: Only watch these signals (None: all signals)
+        :type signals: list(string)
+        :param deadband: Minimal change of numeric signals, either one value or a dictionary per signal
+        :type deadband: float or dict
+        :rtype: FrameSubscription
+        """
+        from .subscription import FrameSubscription
+        subscription = FrameSubscription(callback, frameids, decoder, signals, deadband)
+        self.frame_listener_add(subscription, frameids)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        Remove subscription.
+        :param subscription: Subscription returned by subscribe
+        :type subscription: FrameSubscription
+        """
+        self.frame_listener_remove(subscription, subscription.frameids)
+
+    def frames(self, ids = None, maxsize = 1024, overflow = DISPATCH_OVERFLOW_DROP_OLDEST):
+        """
+        Stream of received frames for asyncio ("async for frame in usblini.frames()").
+        Must be called from a coroutine of the event loop. Close the stream (or use it with
+        "async with") to remove its listener.
+        :param ids: Only stream this LIN frame identifier or set of identifiers (None: all frames)
+        :type ids: integer or list(int)
+        :param maxsize: Maximal number of buffered frames
+        :type maxsize: integer
+        :param overflow: What to do if the consumer falls behind (DISPATCH_OVERFLOW_*)
+        :type overflow: integer
+        :rtype: AsyncStream
+        """
+        from .stream import AsyncStream
+        stream = AsyncStream(asyncio.get_running_loop(), maxsize, overflow,
+                             lambda: self.frame_listener_remove(stream, ids))
+        self.frame_listener_add(stream, ids)
+        return stream
+
+    def status_reports(self, maxsize = 256, overflow = DISPATCH_OVERFLOW_DROP_OLDEST):
+        """
+        Stream of status reports for asyncio ("async for report in usblini.status_reports()").
+        Must be called from a coroutine of the event loop.
+        :param maxsize: Maximal number of buffered status reports
+        :type maxsize: integer
+        :param overflow: What to do if the consumer falls behind (DISPATCH_OVERFLOW_*)
+        :type overflow: integer
+        :rtype: AsyncStream
+        """
+        from .stream import AsyncStream
+        stream = AsyncStream(asyncio.get_running_loop(), maxsize, overflow,
+                             lambda: self.statusreport_listener_remove(stream))
+        self.statusreport_listener_add(stream)
+        return stream
+
+    def frameid_list(self, frameids):
+        if isinstance(frameids, int):
+            frameids = [frameids]
+        frameids = set(frameids)
+        if not all(0 <= frameid < 64 for frameid in frameids):
+            raise USBliniError("ERROR: invalid LIN frame identifier")
+        return frameids
+
+    def frame_listener_table_update(self):
+        """
+        Rebuild the 64 entry dispatch table. Entries are replaced as a whole, so the
+        USB event thread always iterates over a consistent tuple of listeners.
+        """
+        self.frame_listener_table = [tuple(self.frame_listeners + l) for l in self.frame_id_listeners]
+
+    def logic_record_start(self, filename, probename = 'LIN', chunksize = 1 << 20):
+        """
+        Start recording the sampled logic level into a sigrok session file (.sr) for PulseView.
+        Compression and writing are done in a background thread.
+        :param filename: Name of the .sr file
+        :type filename: string
+        :param probename: Name of the channel
+        :type probename: string
+        :param chunksize: Number of samples per chunk in the file
+        :type chunksize: integer
+        :rtype: SigrokRecorder
+        """
+        from .sigrok import SigrokRecorder
+        recorder = SigrokRecorder(filename, probename, chunksize = chunksize)
+        self.logic_listener_add(recorder, self.LOGIC_MODE_SAMPLES)
+        return recorder
+
+    def logic_record_stop(self, recorder):
+        """
+        Stop recording and finish the file.
+        :param recorder: Recorder returned by logic_record_start
+        :type recorder: SigrokRecorder
+        """
+        self.logic_listener_remove(recorder)
+        recorder.close()
+
+    def logic_trigger_start(self, callback, pretrigger, posttrigger, pattern = None, dominant = None, frameids = None, rearm = True):
+        """
+        Arm a triggered logic capture. Samples are kept in a ring buffer; when a trigger
+        fires, the window around it is handed to the callback (from a background thread).
+        :param callback: Called with (index of first sample, samples with one byte 0/1 per sample, index of trigger sample)
+        :type callback: function
+        :param pretrigger: Number of samples before the trigger
+        :type pretrigger: integer
+        :param posttrigger: Number of samples after the trigger
+        :type posttrigger: integer
+        :param pattern: Trigger on this sample sequence, e.g. '10' for a falling edge
+        :type pattern: string
+        :param dominant: Trigger if the level is dominant for this number of samples
+        :type dominant: integer
+        :param frameids: Trigger if a frame with this LIN frame identifier or set of identifiers is received.
+            Frames are reported after their end, so the pretrigger window should cover the frame.
+        :type frameids: integer or list(int)
+        :param rearm: Arm again after a window was handed over
+        :type rearm: bool
+        :rtype: TriggeredCapture
+        """
+        from .logic import TriggeredCapture
+        capture = TriggeredCapture(callback, pretrigger, posttrigger, pattern, dominant, rearm,
+                                   margin = self.ep2_stats.size if self.usbhandle is not None else 4096, frameids = frameids)
+        if frameids is not None:
+            self.frame_listener_add(capture.frame_listener, frameids)
+        self.logic_listener_add(capture)
+        return capture
+
+    def logic_trigger_stop(self, capture):
+        """
+        Stop a triggered logic capture. Windows already triggered are still handed over.
+        :param capture: Capture returned by logic_trigger_start
+        :type capture: TriggeredCapture
+        """
+        self.logic_listener_remove(capture)
+        if capture.frameids is not None:
+            self.frame_listener_remove(capture.frame_listener, capture.frameids)
+        capture.close()
 
     def statusreport_listener_add(self, func):
         """
@@ -282,6 +1283,8 @@ class USBlini(object):
         :type func: function
         """
         self.statusreport_listeners.append(func)
+        # deliver the next status report even if unchanged, so the new listener gets the current state
+        self.statusreport_last = None
 
     def statusreport_listener_remove(self, func):
         """
@@ -294,13 +1297,22 @@ class USBlini(object):
         else:
             raise USBliniError("ERROR: failed to remove status report listener")
 
-    def logic_listener_add(self, func):
+    def logic_listener_add(self, func, mode = LOGIC_MODE_RAW):
         """
         Add a logic listener (callback)
         :param func: Function to add to listener list
         :type func: function
+        :param mode: LOGIC_MODE_RAW: func(packed bytes as received, 8 samples per byte, first sample in MSB),
+                     LOGIC_MODE_SAMPLES: func(index of first sample, samples with one byte 0/1 per sample),
+                     LOGIC_MODE_EDGES: func(sample indices of level changes, level before the first change)
+        :type mode: integer
         """
+        if mode != self.LOGIC_MODE_RAW:
+            from .logic import LogicSampler
+            func = LogicSampler(func, mode)
         self.logic_listeners.append(func)
+        if not self.ep2in_transfer and self.usbhandle is not None:
+            self.ep2in_transfer = self.transfers_submit(self.ep2_stats, self.usbtransfer_ep2_callback)
 
     def logic_listener_remove(self, func):
         """
@@ -308,20 +1320,93 @@ class USBlini(object):
         :param func: Function to remove from listener list
         :type func: function
         """
-        if func in self.logic_listeners:
-            self.logic_listeners.remove(func)
+        for listener in self.logic_listeners:
+            if listener == func or getattr(listener, 'callback', None) == func:
+                self.logic_listeners.remove(listener)
+                return
+        raise USBliniError("ERROR: failed to remove logic listener")
+
+
+class ScanResult(object):
+
+    def __init__(self, frameid, repetitions):
+        self.frameid = frameid
+        self.repetitions = repetitions
+        self.responses = 0
+        self.length = None
+        self.checksummode = None
+        self.device_times = []
+
+    def __repr__(self):
+        modes = {checksum.CHECKSUM_MODE_LIN1: 'LIN1', checksum.CHECKSUM_MODE_LIN2: 'LIN2'}
+        return '{} len={} checksum={} responses={}/{}'.format(hex(self.frameid), self.length, modes.get(self.checksummode, '?'),
+                                                            self.responses, self.repetitions)
+
+    def add(self, frame):
+        # the sequence may run a little longer than the requested repetitions
+        if self.responses >= self.repetitions:
+            return
+        self.responses += 1
+        self.length = len(frame.data)
+        self.checksummode = frame.checksum_model
+        self.device_times.append(frame.device_time)
+
+class MasterWriteRequest(object):
+
+    def __init__(self, frameid, loop = None):
+        self.frameid = frameid
+        self.loop = loop
+        self.report = None
+        self.abandoned = False
+        self.exception = None
+        self.transfer = None
+        self.start = time.perf_counter()
+        if loop is None:
+            self.event = threading.Event()
         else:
-            raise USBliniError("ERROR: failed to remove logic listener")
+            self.future = loop.create_future()
 
+    def complete(self, report):
+        self.report = report
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.resolve, report, None)
+
+    def fail(self, exception):
+        self.exception = exception
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.resolve, None, exception)
+
+    def resolve(self, report, exception):
+        if self.future.done():
+            return
+        if exception is None:
+            self.future.set_result(report)
+        else:
+            self.future.set_exception(exception)
 
 class LINFrame(object):
 
-    def __init__(self, frameid, data=None, checksum = None, timestamp = None, autobaudvalue = None):
+    __slots__ = ('frameid', 'data', 'checksum', 'timestamp', 'autobaudvalue', 'device_time', 'host_time', 'checksum_model')
+
+    def __init__(self, frameid, data=None, checksum = None, timestamp = None, autobaudvalue = None, device_time = None, host_time = None):
+        """
+        :param timestamp: Raw 16 bit device timestamp in milliseconds
+        :param device_time: Unwrapped monotonic device time in milliseconds
+        :param host_time: Estimated host time (time.time() clock) of the frame in seconds
+        """
         self.frameid = frameid
         self.data = data
         self.checksum = checksum
         self.timestamp = timestamp
         self.autobaudvalue = autobaudvalue
+        self.device_time = device_time
+        self.host_time = host_time
+        # detected checksum model (CHECKSUM_MODE_LIN1/LIN2), None if no checksum or no model matches
+        self.checksum_model = None if data is None else checksum_model(frameid, data, checksum)
 
     def __repr__(self):
         if len(self.data) > 0:
@@ -329,52 +1414,275 @@ class LINFrame(object):
         else:
             return '{} []'.format(hex(self.frameid))
 
+    @property
+    def checksum_ok(self):
+        """
+        True if the checksum matches the classic or enhanced model, None if the frame has no checksum.
+        """
+        if self.checksum is None:
+            return None
+        return self.checksum_model is not None
+
     @classmethod
     def from_report(cls, r):
-        pid = r[1]
-        frameid = pid & 0x3f
-        length = r[2]
+        return cls.from_fields(*REPORT_STRUCT.unpack_from(r)[1:])
+
+    @classmethod
+    def from_fields(cls, pid, length, payload, timestamp, autobaudvalue):
         if length > 1:
             length = length - 1
-            checksum = r[3 + length] 
+            checksum = payload[length]
         else:
-            checksum = None    
-        data = r[3:3 + length]   
-        timestamp = r[13]<<8 | r[12]
-        autobaudvalue = r[15]<<8 | r[14]
-        return cls(frameid, data, checksum, timestamp, autobaudvalue)
+            checksum = None
+        return cls(pid & 0x3f, payload[:length], checksum, timestamp, autobaudvalue)
+
+def iter_bits(mask):
+    """
+    Iterate over the numbers of the set bits of mask.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+# bit lists of all byte values (bit0 first)
+BYTE_BITS = [[True if b & (1 << n) else False for n in range(8)] for b in range(256)]
 
 class StatusReport(object):
 
+    __slots__ = ('errorflags', 'slaveTableStatus')
+
     def __init__(self, errorflags, slaveTableStatus):
         self.errorflags = errorflags
         self.slaveTableStatus = slaveTableStatus
 
+    def __eq__(self, other):
+        return isinstance(other, StatusReport) and \
+            (self.errorflags, self.slaveTableStatus) == (other.errorflags, other.slaveTableStatus)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.errorflags, self.slaveTableStatus))
+
     def getSlaveTableStatusList(self):
-        return [True if self.slaveTableStatus & (1 << n) else False for n in range(16)]
+        return BYTE_BITS[self.slaveTableStatus & 0xff] + BYTE_BITS[self.slaveTableStatus >> 8]
+
+    def isSlaveTableActive(self, tableid):
+        return (self.slaveTableStatus >> tableid) & 1 == 1
+
+    def hasErrorflag(self, bit):
+        return (self.errorflags >> bit) & 1 == 1
+
+    def getChangedSlaveTables(self, previous = None):
+        """
+        :param previous: Previous status report (None: everything changed)
+        :return: Bit mask of slave table entries whose status differs from previous
+        :rtype: integer
+        """
+        if previous is None:
+            return 0xffff
+        return self.slaveTableStatus ^ previous.slaveTableStatus
+
+    def getChangedErrorflags(self, previous = None):
+        """
+        :param previous: Previous status report (None: everything changed)
+        :return: Bit mask of error flags which differ from previous
+        :rtype: integer
+        """
+        if previous is None:
+            return 0xff
+        return self.errorflags ^ previous.errorflags
 
     @classmethod
     def from_report(cls, r):
-        errorflags = r[1]
-        slaveTableStatus = r[3]<<8 | r[2]
-        return cls(errorflags, slaveTableStatus)
+        return cls.from_fields(*REPORT_STRUCT.unpack_from(r)[1:])
+
+    @classmethod
+    def from_fields(cls, errorflags, length, payload, timestamp, autobaudvalue):
+        return cls(errorflags, payload[0]<<8 | length)
 
 class USBliniUSBEventHandler(threading.Thread):
+    def __init__(self, ctx):
+        threading.Thread.__init__(self)
+        self.ctx = ctx
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.ctx.handleEvents()
+    def stop(self):
+        self.running = False
+
+class USBliniReconnectHandler(threading.Thread):
+
+    # reopening is retried with doubling delay (e.g. while udev applies permissions)
+    RETRY_DELAY = 0.1
+    RETRY_DELAY_MAX = 3.2
+
     def __init__(self, lini):
         threading.Thread.__init__(self)
+        self.daemon = True
         self.lini = lini
+        self.event = threading.Event()
         self.running = True
 
     def run(self):
-        while self.running:
-            self.lini.ctx.handleEvents()
+        while True:
+            self.event.wait()
+            self.event.clear()
+            delay = self.RETRY_DELAY
+            while self.running and not self.lini.connected:
+                # give the device some time to finish enumeration, a new event retries at once
+                if self.event.wait(delay):
+                    self.event.clear()
+                if not self.running:
+                    break
+                try:
+                    if self.lini.reconnect():
+                        break
+                except usb1.USBError:
+                    pass
+                if delay >= self.RETRY_DELAY_MAX:
+                    # wait for the next hotplug event
+                    break
+                delay *= 2
+            if not self.running:
+                return
+
+    def trigger(self):
+        self.event.set()
+
     def stop(self):
         self.running = False
+        self.event.set()
+
+class USBliniTransferStats(object):
+
+    def __init__(self, endpoint, depth, size):
+        self.endpoint = endpoint
+        self.depth = depth
+        self.size = size
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.starved = 0
+
+    def transfer_completed(self):
+        self.completed += 1
+        self.pending -= 1
+        if self.pending == 0:
+            self.starved += 1
+
+    def transfer_failed(self, t):
+        self.failed += 1
+        self.pending -= 1
+        return False
+
+    def snapshot(self):
+        return {'depth': self.depth, 'size': self.size, 'pending': self.pending,
+                'completed': self.completed, 'failed': self.failed, 'starved': self.starved}
+
+class USBliniDispatcher(threading.Thread):
+    def __init__(self, lini, queuesize, slotsize, overflow, batchsize):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.lini = lini
+        self.queuesize = queuesize
+        self.overflow = overflow
+        self.batchsize = batchsize
+        self.slots = [bytearray(slotsize) for _ in range(queuesize)]
+        self.spares = [bytearray(slotsize) for _ in range(batchsize)]
+        self.endpoints = [0] * queuesize
+        self.lengths = [0] * queuesize
+        self.hosttimes = [0.0] * queuesize
+        self.head = 0
+        self.count = 0
+        self.dropped_reports = 0
+        self.dropped_logic_bytes = 0
+        self.listener_errors = 0
+        self.last_error = None
+        self.condition = threading.Condition()
+        self.running = True
+
+    def put(self, endpoint, buffer, length, hosttime):
+        with self.condition:
+            if self.count == self.queuesize:
+                if self.overflow == USBlini.DISPATCH_OVERFLOW_DROP_NEWEST:
+                    self.count_dropped(endpoint, length)
+                    return
+                elif self.overflow == USBlini.DISPATCH_OVERFLOW_DROP_OLDEST:
+                    self.count_dropped(self.endpoints[self.head], self.lengths[self.head])
+                    self.head = (self.head + 1) % self.queuesize
+                    self.count -= 1
+                else:
+                    while self.count == self.queuesize and self.running:
+                        self.condition.wait()
+                    if not self.running:
+                        self.count_dropped(endpoint, length)
+                        return
+            index = (self.head + self.count) % self.queuesize
+            self.slots[index][:length] = buffer[:length]
+            self.endpoints[index] = endpoint
+            self.lengths[index] = length
+            self.hosttimes[index] = hosttime
+            self.count += 1
+            self.condition.notify_all()
+
+    def count_dropped(self, endpoint, length):
+        if endpoint == 1:
+            self.dropped_reports += length // REPORT_SIZE
+        else:
+            self.dropped_logic_bytes += length
+
+    def run(self):
+        listener_thread.active = True
+        while True:
+            with self.condition:
+                while self.count == 0 and self.running:
+                    self.condition.wait()
+                if self.count == 0:
+                    return
+                # swap filled slots with spare buffers, so the producer can go on while we deliver
+                batch = []
+                for i in range(min(self.count, self.batchsize)):
+                    index = (self.head + i) % self.queuesize
+                    self.slots[index], self.spares[i] = self.spares[i], self.slots[index]
+                    batch.append((self.spares[i], self.endpoints[index], self.lengths[index], self.hosttimes[index]))
+                self.head = (self.head + len(batch)) % self.queuesize
+                self.count -= len(batch)
+                self.condition.notify_all()
+
+            for buffer, endpoint, length, hosttime in batch:
+                # a failing listener must not stop the worker, the producer would block
+                try:
+                    if endpoint == 1:
+                        self.lini.process_ep1(buffer, length, hosttime)
+                    else:
+                        self.lini.process_ep2(memoryview(buffer)[:length])
+                except Exception as e:
+                    self.listener_errors += 1
+                    self.last_error = e
+                    traceback.print_exc()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
 
 class USBliniError(Exception):
     def __init__(self, message):
         Exception.__init__(self, message)
 
+class USBliniTimeoutError(USBliniError):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
+class USBliniChecksumError(USBliniError):
+    def __init__(self, message):
+        Exception.__init__(self, message)
+
 class USBliniNotFoundError(USBliniError):
     def __init__(self, message):
         Exception.__init__(self, message)